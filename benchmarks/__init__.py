@@ -0,0 +1,3 @@
+"""
+Offline benchmarks and load tools (no Google or Telegram access needed)
+"""
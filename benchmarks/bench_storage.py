@@ -0,0 +1,178 @@
+"""
+Storage layer benchmark on the in-memory sheet
+
+    python -m benchmarks.bench_storage
+    python -m benchmarks.bench_storage --sizes 1000 10000 --latency 0.05 --error-rate 0.05
+    python -m benchmarks.bench_storage --json results.json
+
+For every sheet size it measures the initial full sync, a 3-column
+projected read, add_booking, the flush to the sheet, per-user reads and
+a reminder reconcile pass, and reports throughput with p50/p99 latency. The JSON output is meant to be
+kept as a CI artifact and compared between runs.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from benchmarks.fake_sheets import SERVICES, FakeSheetsService, FakeWorksheet, make_rows
+from bot.reminders import ReminderSystem
+from bot.services.reminder_ledger import ReminderLedger
+from bot.services.visit_time import format_visit
+
+USERS = 1000
+
+
+def visit_slot(i: int) -> datetime:
+    """i-th slot on the working-hours grid, starting a week ahead"""
+    first = (datetime.now() + timedelta(days=7)).replace(hour=9, minute=0, second=0, microsecond=0)
+    return first + timedelta(days=i // 22, minutes=30 * (i % 22))
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure(
+    name: str,
+    size: int,
+    op: Callable[[int], Awaitable[object]],
+    repeat: int
+) -> Dict:
+    """Run `op` `repeat` times one after another, collect latencies"""
+    latencies: List[float] = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        await op(i)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    return {
+        "op": name,
+        "rows": size,
+        "n": repeat,
+        "ops_per_sec": repeat / total if total else float("inf"),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+async def bench_size(size: int, args: argparse.Namespace) -> List[Dict]:
+    rnd = random.Random(size)
+    worksheet = FakeWorksheet(
+        make_rows(size, users=USERS),
+        latency=args.latency,
+        jitter=args.latency / 2,
+        error_rate=args.error_rate,
+        seed=size
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bookings.db")
+        sheets = FakeSheetsService(
+            worksheet,
+            db_path=db_path,
+            max_staleness=3600,
+            quota_per_minute=args.quota
+        )
+        ledger = ReminderLedger(db_path)
+        reminders = ReminderSystem(None, sheets, ledger)
+        results = []
+        try:
+            results.append(await measure(
+                "sync_full", size, lambda i: sheets.sync(full=True), 1
+            ))
+            results.append(await measure(
+                "read_columns_3", size,
+                lambda i: sheets.read_columns(("Visit Date/Time", "User ID", "Service")),
+                max(1, args.ops // 20)
+            ))
+            results.append(await measure(
+                "sync_tail", size, lambda i: sheets.sync(), args.ops
+            ))
+
+            results.append(await measure(
+                "add_booking", size,
+                lambda i: sheets.add_booking(
+                    f"Bench {i}", f"+38067{i:07d}", rnd.choice(SERVICES),
+                    format_visit(visit_slot(i)),
+                    100000 + rnd.randrange(USERS)
+                ),
+                args.ops
+            ))
+            results.append(await measure(
+                "flush_batch", size,
+                lambda i: sheets.flush_pending(args.batch),
+                max(1, args.ops // args.batch)
+            ))
+            results.append(await measure(
+                "get_bookings_by_user", size,
+                lambda i: sheets.get_bookings_by_user(100000 + rnd.randrange(USERS)),
+                args.ops
+            ))
+            results.append(await measure(
+                "get_upcoming_by_user", size,
+                lambda i: sheets.get_upcoming_bookings_by_user(100000 + rnd.randrange(USERS)),
+                args.ops
+            ))
+            results.append(await measure(
+                "reminder_reconcile", size, lambda i: reminders.reconcile(), args.reconcile
+            ))
+        finally:
+            sheets.close()
+            ledger.close()
+        logging.getLogger(__name__).info(
+            f"rows={size}: {worksheet.requests} sheet requests, {worksheet.errors} injected errors"
+        )
+        return results
+
+
+def print_table(results: List[Dict]) -> None:
+    print(f"{'op':<22}{'rows':>8}{'n':>6}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['op']:<22}{r['rows']:>8}{r['n']:>6}{r['ops_per_sec']:>12.1f}"
+              f"{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+
+
+async def main(args: argparse.Namespace) -> List[Dict]:
+    results = []
+    for size in args.sizes:
+        results.extend(await bench_size(size, args))
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="sheet sizes in rows")
+    parser.add_argument("--ops", type=int, default=200, help="repetitions of each operation")
+    parser.add_argument("--reconcile", type=int, default=5, help="reminder reconcile passes")
+    parser.add_argument("--batch", type=int, default=50, help="flush batch size")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated seconds per Sheets request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of Sheets requests failing with 429")
+    parser.add_argument("--quota", type=float, default=1e9,
+                        help="Sheets requests per minute allowed by the governor")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Сервис пишет строку лога на каждую бронь - для замеров это шум
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    logging.getLogger(__name__).setLevel(logging.INFO)
+    results = asyncio.run(main(args))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
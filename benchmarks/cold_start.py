@@ -0,0 +1,158 @@
+"""
+Cold start measurement: import time and time to first reply
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --mode blocking --connect-latency 2
+
+Every run is a fresh interpreter (cold imports) started in a scratch
+directory. It imports bot.main, starts the dispatcher against the local
+Bot API stand-in and the in-memory sheet (connect_latency simulates the
+OAuth handshake and spreadsheet open), and one user presses
+"📋 Мої записи" right away. Reported per run, in seconds since the
+process started: imports, first reply and warm-up milestones.
+
+The first run starts with an empty bookings.db, the following ones reuse
+it, like a restart on deploy.
+"""
+import time
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+USER_ID = 100001
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def child(args: argparse.Namespace) -> Dict:
+    """One cold start, in this process"""
+    import bot.main  # noqa: F401  - what a real start imports
+    imports = time.perf_counter() - STARTED
+
+    import asyncio
+    import dataclasses
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from benchmarks.fake_bot_api import TOKEN, FakeBotAPI
+    from benchmarks.fake_sheets import FakeSheetsService, FakeWorksheet, make_rows
+    from bot.config import config
+    from bot.main import BotServices
+    from bot.startup import StartupTracker
+
+    # Подготовка стенда в зачет не идет
+    setup_started = time.perf_counter()
+    api = FakeBotAPI()
+    await api.start()
+    worksheet = FakeWorksheet(make_rows(args.rows), latency=args.sheet_latency)
+    replied = asyncio.get_running_loop().create_future()
+    api.on_reply = lambda chat_id, params: replied.done() or replied.set_result(time.perf_counter())
+    await api.push_text(USER_ID, "📋 Мої записи")
+    setup = time.perf_counter() - setup_started
+
+    tracker = StartupTracker(STARTED + setup)
+    sheets = FakeSheetsService(worksheet, db_path=args.db, connect_latency=args.connect_latency)
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    # Тот же BotServices, что в bot/main.py
+    settings = dataclasses.replace(
+        config, admin_id=0, bookings_db=args.db, startup_mode=args.mode, bot_mode="polling"
+    )
+    services = BotServices(bot, sheets, tracker, settings)
+    services.start()
+    if args.mode == "blocking":
+        await services.run_background()
+    polling = asyncio.create_task(
+        services.dp.start_polling(bot, handle_signals=False, polling_timeout=1)
+    )
+    try:
+        first_reply = await asyncio.wait_for(replied, args.timeout) - STARTED - setup
+        # Ждем конца прогрева (в фоне), чтобы видеть все вехи
+        deadline = time.perf_counter() + args.timeout
+        while "availability" not in tracker.milestones and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+    finally:
+        await services.dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await services.shutdown()
+        await bot.session.close()
+        await api.stop()
+        sheets.close()
+    return {
+        "imports_s": imports,
+        "first_reply_s": first_reply,
+        "milestones": tracker.milestones,
+    }
+
+
+def run_once(args: argparse.Namespace, workdir: str) -> Dict:
+    command = [
+        sys.executable, "-m", "benchmarks.cold_start", "--child",
+        "--mode", args.mode,
+        "--rows", str(args.rows),
+        "--connect-latency", str(args.connect_latency),
+        "--sheet-latency", str(args.sheet_latency),
+        "--timeout", str(args.timeout),
+        "--db", os.path.join(workdir, "bookings.db"),
+    ]
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT}
+    result = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_report(results: List[Dict]) -> None:
+    milestones = sorted({name for result in results for name in result["milestones"]},
+                        key=lambda name: statistics.median(
+                            r["milestones"].get(name, 0.0) for r in results))
+    print(f"{'run':<6}{'imports':>9}{'first reply':>13}" + "".join(f"{name:>14}" for name in milestones))
+    for index, result in enumerate(results):
+        label = "cold" if index == 0 else f"#{index}"
+        cells = "".join(
+            f"{result['milestones'][name]:>14.3f}" if name in result["milestones"] else f"{'-':>14}"
+            for name in milestones
+        )
+        print(f"{label:<6}{result['imports_s']:>9.3f}{result['first_reply_s']:>13.3f}{cells}")
+    if len(results) > 1:
+        restarts = results[1:]
+        print(f"restarts: median imports {statistics.median(r['imports_s'] for r in restarts):.3f}s, "
+              f"median first reply {statistics.median(r['first_reply_s'] for r in restarts):.3f}s")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="process starts (the first with an empty db)")
+    parser.add_argument("--mode", choices=("background", "blocking"), default="background",
+                        help="warm up after updates start, or before (STARTUP_MODE)")
+    parser.add_argument("--rows", type=int, default=10000, help="rows in the fake sheet")
+    parser.add_argument("--connect-latency", type=float, default=1.5,
+                        help="simulated seconds of OAuth handshake + spreadsheet open")
+    parser.add_argument("--sheet-latency", type=float, default=0.2,
+                        help="simulated seconds per Sheets request")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.child:
+        import asyncio
+        # Последней строкой stdout идет результат
+        result = asyncio.run(child(args))
+        print(json.dumps(result))
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            results = [run_once(args, workdir) for _ in range(args.runs)]
+        print_report(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,133 @@
+"""
+Local stand-in for the Telegram Bot API
+
+An aiohttp server answering getMe, getUpdates (long polling) and
+sendMessage, plus no-op answers for the other methods the handlers call.
+Updates are injected with push_*(); every bot reply is reported to
+`on_reply(chat_id, payload)` so a load generator can match it to the
+update that caused it.
+"""
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_ID = 123456
+TOKEN = f"{BOT_ID}:LOADTEST-token-not-real"
+
+
+class FakeBotAPI:
+    def __init__(self, on_reply: Optional[Callable[[int, Dict], None]] = None):
+        self.on_reply = on_reply
+        self._updates: List[Dict] = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Condition()
+        self.calls: Dict[str, int] = {}
+        self.sent_to: Dict[int, int] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    # --- injecting updates ---
+
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+                "username": f"user{user_id}", "language_code": "uk"}
+
+    def _message(self, user_id: int, **fields: Any) -> Dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            **fields,
+        }
+
+    async def _push(self, update: Dict) -> int:
+        update_id = next(self._update_ids)
+        async with self._new_update:
+            self._updates.append({"update_id": update_id, **update})
+            self._new_update.notify_all()
+        return update_id
+
+    async def push_text(self, user_id: int, text: str) -> int:
+        fields: Dict[str, Any] = {"text": text}
+        if text.startswith("/"):
+            command = text.split()[0]
+            fields["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return await self._push({"message": self._message(user_id, **fields)})
+
+    async def push_web_app_data(self, user_id: int, data: Dict) -> int:
+        payload = {"data": json.dumps(data, ensure_ascii=False), "button_text": "Записатися"}
+        return await self._push({"message": self._message(user_id, web_app_data=payload)})
+
+    # --- Bot API methods ---
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        async with self._new_update:
+            # Подтвержденные ботом апдейты больше не нужны
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self._updates[:limit]
+
+    def _send_message(self, params: Dict) -> Dict:
+        chat_id = int(params["chat_id"])
+        self.sent_to[chat_id] = self.sent_to.get(chat_id, 0) + 1
+        result = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": BOT_ID, "is_bot": True, "first_name": "Load test bot"},
+            "text": params.get("text", ""),
+        }
+        if self.on_reply is not None:
+            self.on_reply(chat_id, params)
+        return result
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params: Dict[str, Any] = dict(await request.post())
+        if not params and request.can_read_body:
+            params = await request.json()
+
+        name = method.lower()
+        if name == "getme":
+            result: Any = {"id": BOT_ID, "is_bot": True, "first_name": "Load test bot",
+                           "username": "load_test_bot"}
+        elif name == "getupdates":
+            result = await self._get_updates(params)
+        elif name == "sendmessage":
+            result = self._send_message(params)
+        else:
+            # deleteWebhook, answerCallbackQuery, editMessageReplyMarkup, ...
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    # --- lifecycle ---
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,258 @@
+"""
+In-memory stand-in for a gspread Worksheet
+
+Implements the calls the bot makes (get_all_values, get_values, row_values,
+append_row(s), update, delete_rows, batch_update, format) plus get_all_records, with optional
+simulated latency and quota/server errors. Thread-safe: the service calls
+it from its worker pool, like the real client.
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import gspread
+
+from bot.services.google_sheets import GoogleSheetsService
+from bot.services.visit_time import format_visit, to_iso
+
+SERVICES = [
+    "Чоловіча стрижка",
+    "Жіноча стрижка",
+    "Дитяча стрижка",
+    "Фарбування коренів",
+    "Повне фарбування",
+    "Манікюр",
+]
+
+
+class _FakeResponse:
+    """Just enough of requests.Response for gspread.exceptions.APIError"""
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.text = json.dumps({"error": {"code": status_code, "message": message}})
+
+    def json(self) -> Dict:
+        return json.loads(self.text)
+
+
+def _column_number(letters: str) -> int:
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord("A") + 1
+    return number
+
+
+class FakeWorksheet:
+    """
+    Rows live in a list of lists (row 1 = headers).
+
+    latency   - seconds added to every request (plus up to `jitter` more)
+    error_rate - share of requests that fail with APIError(error_status)
+    """
+
+    def __init__(
+        self,
+        rows: Optional[List[List[Any]]] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        seed: Optional[int] = None
+    ):
+        self.rows: List[List[str]] = [[str(value) for value in row] for row in rows or []]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Для batch_update: worksheet.client.batch_update(worksheet.spreadsheet_id, body)
+        self.id = 0
+        self.spreadsheet_id = "fake"
+        self.client = self
+
+    def _request(self) -> None:
+        """Simulate the round trip: sleep, then maybe fail"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.random() * self.jitter
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            message = "Quota exceeded" if self.error_status == 429 else "Backend error"
+            raise gspread.exceptions.APIError(_FakeResponse(self.error_status, message))
+
+    # --- reads ---
+
+    def get_all_values(self) -> List[List[str]]:
+        self._request()
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def get_values(self, range_name: str) -> List[List[str]]:
+        """Only the "A5:I" / "A5:I9" forms the service uses"""
+        self._request()
+        match = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", range_name)
+        if match is None:
+            raise ValueError(f"unsupported range {range_name!r}")
+        first_col, first_row, last_col, last_row = match.groups()
+        start = _column_number(first_col) - 1
+        stop = _column_number(last_col)
+        with self._lock:
+            end = int(last_row) if last_row else len(self.rows)
+            values = [list(row[start:stop]) for row in self.rows[int(first_row) - 1:end]]
+        # Как Google: пустые строки в конце диапазона не возвращаются
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def batch_get(self, ranges: List[str], major_dimension: Optional[str] = None) -> List[List[List[str]]]:
+        """One request for several ranges; COLUMNS returns one list per column"""
+        self._request()
+        result = []
+        for range_name in ranges:
+            match = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", range_name)
+            first_col, first_row, last_col, last_row = match.groups()
+            start, stop = _column_number(first_col) - 1, _column_number(last_col)
+            with self._lock:
+                end = int(last_row) if last_row else len(self.rows)
+                rows = [row[start:stop] for row in self.rows[int(first_row) - 1:end]]
+            # Как у Google: пустые строки и ячейки в конце не возвращаются
+            rows = [list(row) for row in rows]
+            while rows and not any(rows[-1]):
+                rows.pop()
+            if major_dimension == "COLUMNS":
+                width = max((len(row) for row in rows), default=0)
+                rows = [[row[i] if i < len(row) else "" for row in rows] for i in range(width)]
+                for column in rows:
+                    while column and column[-1] == "":
+                        column.pop()
+            result.append(rows)
+        return result
+
+    def row_values(self, row: int) -> List[str]:
+        self._request()
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_all_records(self) -> List[Dict[str, str]]:
+        self._request()
+        with self._lock:
+            if not self.rows:
+                return []
+            headers = self.rows[0]
+            return [dict(zip(headers, row)) for row in self.rows[1:]]
+
+    # --- writes ---
+
+    def append_rows(self, values: List[List[Any]], **kwargs: Any) -> Dict:
+        self._request()
+        with self._lock:
+            first = len(self.rows) + 1
+            self.rows.extend([str(value) for value in row] for row in values)
+            last = len(self.rows)
+        return {"updates": {"updatedRange": f"Sheet1!A{first}:I{last}", "updatedRows": len(values)}}
+
+    def append_row(self, values: List[Any], **kwargs: Any) -> Dict:
+        return self.append_rows([values], **kwargs)
+
+    def update(self, values: List[List[Any]], range_name: str, **kwargs: Any) -> Dict:
+        self._request()
+        match = re.match(r"[A-Z]+(\d+)", range_name)
+        first = int(match.group(1)) if match else 1
+        with self._lock:
+            for offset, row in enumerate(values):
+                index = first - 1 + offset
+                while len(self.rows) <= index:
+                    self.rows.append([])
+                self.rows[index] = [str(value) for value in row]
+        return {"updatedRange": f"Sheet1!{range_name}"}
+
+    def delete_rows(self, start_index: int, end_index: Optional[int] = None) -> Dict:
+        self._request()
+        with self._lock:
+            del self.rows[start_index - 1:(end_index or start_index)]
+        return {}
+
+    def fetch_sheet_metadata(self, spreadsheet_id: str) -> Dict:
+        """Grid size only; the fake grid is exactly the rows it holds"""
+        self._request()
+        with self._lock:
+            rows = len(self.rows)
+        return {"sheets": [{"properties": {"sheetId": self.id, "gridProperties": {"rowCount": rows}}}]}
+
+    def batch_update(self, spreadsheet_id: str, body: Dict) -> Dict:
+        """Spreadsheet batchUpdate, only deleteDimension of rows"""
+        self._request()
+        with self._lock:
+            for request in body["requests"]:
+                target = request["deleteDimension"]["range"]
+                del self.rows[target["startIndex"]:target["endIndex"]]
+        return {"replies": [{} for _ in body["requests"]]}
+
+    def format(self, range_name: str, fmt: Dict) -> None:
+        self._request()
+
+
+class FakeSheetsService(GoogleSheetsService):
+    """
+    GoogleSheetsService wired to a FakeWorksheet instead of Google;
+    connect_latency stands for the OAuth handshake and spreadsheet open
+    """
+
+    def __init__(self, worksheet: FakeWorksheet, *args: Any, connect_latency: float = 0.0, **kwargs: Any):
+        kwargs.setdefault("credentials_file", "")
+        kwargs.setdefault("sheet_name", "fake")
+        super().__init__(*args, **kwargs)
+        self.fake = worksheet
+        self.connect_latency = connect_latency
+
+    def _connect(self) -> None:
+        if self.connect_latency:
+            time.sleep(self.connect_latency)
+        self._worksheet = self.fake
+
+    def _refresh_token_if_expiring(self, margin: timedelta) -> bool:
+        return False
+
+
+def make_rows(
+    count: int,
+    users: int = 1000,
+    start: Optional[datetime] = None,
+    seed: int = 1
+) -> List[List[Any]]:
+    """
+    Headers plus `count` bookings spread over `users` users and the
+    60 days around `start` (now by default), on the 30 minute grid.
+    """
+    rnd = random.Random(seed)
+    start = (start or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows: List[List[Any]] = [list(GoogleSheetsService.HEADERS)]
+    for booking_id in range(1, count + 1):
+        visit = start + timedelta(
+            days=rnd.randint(-30, 30), hours=rnd.randint(9, 19), minutes=rnd.choice((0, 30))
+        )
+        user_id = 100000 + rnd.randrange(users)
+        rows.append([
+            booking_id,
+            (visit - timedelta(days=rnd.randint(1, 14))).strftime("%d.%m.%Y %H:%M"),
+            f"Client {booking_id}",
+            f"+38050{booking_id:07d}",
+            rnd.choice(SERVICES),
+            format_visit(visit),
+            user_id,
+            f"user{user_id}",
+            to_iso(visit),
+        ])
+    return rows
@@ -0,0 +1,223 @@
+"""
+End-to-end load test: the real dispatcher and handlers against a local
+Bot API stand-in and the in-memory sheet
+
+    python -m benchmarks.load --users 200 --duration 30
+    python -m benchmarks.load --users 50 --sheet-latency 0.3 --error-rate 0.02
+
+N virtual users send /start, "📋 Мої записи" and web app bookings in a loop
+(one request in flight per user, exponential think time between them).
+Reported: update-to-first-reply latency p50/p99 per kind and throughput.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.bench_storage import percentile
+from benchmarks.fake_bot_api import TOKEN, FakeBotAPI
+from benchmarks.fake_sheets import SERVICES, FakeSheetsService, FakeWorksheet, make_rows
+from bot.config import config
+from bot.main import BotServices
+from bot.services.visit_time import format_visit
+from bot.startup import StartupTracker
+
+FIRST_USER_ID = 100000
+KINDS = {
+    "start": 1,
+    "my_bookings": 3,
+    "booking": 1,
+}
+
+
+class LoadGenerator:
+    """Virtual users and the bookkeeping of their pending requests"""
+
+    def __init__(self, api: FakeBotAPI, users: int, think: float, reply_timeout: float, seed: int):
+        self.api = api
+        self.users = users
+        self.think = think
+        self.reply_timeout = reply_timeout
+        self.rnd = random.Random(seed)
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self.latencies: Dict[str, List[float]] = {kind: [] for kind in KINDS}
+        self.timeouts: Dict[str, int] = {kind: 0 for kind in KINDS}
+        api.on_reply = self.on_reply
+
+    def on_reply(self, chat_id: int, params: Dict) -> None:
+        future = self._waiting.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    def _booking(self) -> Dict:
+        visit = (datetime.now() + timedelta(days=self.rnd.randint(1, 60))).replace(
+            hour=self.rnd.randint(9, 18), minute=self.rnd.choice((0, 30)), second=0, microsecond=0
+        )
+        return {
+            "name": "Load Test",
+            "phone": f"+38063{self.rnd.randrange(10 ** 7):07d}",
+            "service": self.rnd.choice(SERVICES),
+            "datetime": format_visit(visit),
+        }
+
+    async def _request(self, user_id: int, kind: str) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[user_id] = future
+        started = time.perf_counter()
+        if kind == "start":
+            await self.api.push_text(user_id, "/start")
+        elif kind == "my_bookings":
+            await self.api.push_text(user_id, "📋 Мої записи")
+        else:
+            await self.api.push_web_app_data(user_id, self._booking())
+        try:
+            replied = await asyncio.wait_for(future, self.reply_timeout)
+            self.latencies[kind].append(replied - started)
+        except asyncio.TimeoutError:
+            self._waiting.pop(user_id, None)
+            self.timeouts[kind] += 1
+
+    async def user(self, index: int, deadline: float, ramp_up: float) -> None:
+        await asyncio.sleep(ramp_up * index / self.users)
+        user_id = FIRST_USER_ID + index
+        kinds, weights = list(KINDS), list(KINDS.values())
+        while time.perf_counter() < deadline:
+            await self._request(user_id, self.rnd.choices(kinds, weights)[0])
+            if self.think:
+                await asyncio.sleep(self.rnd.expovariate(1 / self.think))
+
+    async def run(self, duration: float, ramp_up: float) -> float:
+        started = time.perf_counter()
+        deadline = started + ramp_up + duration
+        await asyncio.gather(*(self.user(i, deadline, ramp_up) for i in range(self.users)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> Dict:
+        rows = []
+        for kind, samples in self.latencies.items():
+            rows.append({
+                "kind": kind,
+                "replies": len(samples),
+                "timeouts": self.timeouts[kind],
+                "p50_ms": percentile(samples, 0.50) * 1000 if samples else None,
+                "p99_ms": percentile(samples, 0.99) * 1000 if samples else None,
+            })
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "users": self.users,
+            "elapsed_s": elapsed,
+            "replies_per_sec": total / elapsed if elapsed else 0.0,
+            "kinds": rows,
+        }
+
+
+async def main(args: argparse.Namespace) -> Dict:
+    api = FakeBotAPI()
+    await api.start()
+    generator = LoadGenerator(api, args.users, args.think, args.reply_timeout, args.seed)
+
+    worksheet = FakeWorksheet(
+        make_rows(args.rows, users=args.users),
+        latency=args.sheet_latency,
+        jitter=args.sheet_latency / 2,
+        error_rate=args.error_rate,
+        seed=args.seed
+    )
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "bookings.db")
+    sheets = FakeSheetsService(
+        worksheet,
+        db_path=db_path,
+        quota_per_minute=args.quota
+    )
+
+    # Тот же BotServices, что собирает bot/main.py, только API и таблица локальные
+    settings = dataclasses.replace(
+        config,
+        admin_id=args.admin_id,
+        admin_digest_window=args.digest_window,
+        bookings_db=db_path,
+        startup_mode="background",
+        bot_mode="polling",
+        trace_updates=False
+    )
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    services = BotServices(bot, sheets, StartupTracker(time.perf_counter()), settings)
+    services.start()
+    polling = asyncio.create_task(
+        services.dp.start_polling(bot, handle_signals=False, polling_timeout=5)
+    )
+    try:
+        elapsed = await generator.run(args.duration, args.ramp_up)
+    finally:
+        await services.dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await services.shutdown()
+        await bot.session.close()
+        await api.stop()
+        sheets.close()
+        tmp.cleanup()
+
+    result = generator.report(elapsed)
+    result["sheet_requests"] = worksheet.requests
+    result["sheet_errors"] = worksheet.errors
+    result["api_calls"] = api.calls
+    result["admin_messages"] = api.sent_to.get(args.admin_id, 0)
+    result["page_cache"] = services.page_cache.stats()
+    return result
+
+
+def print_report(result: Dict) -> None:
+    print(f"{result['users']} users, {result['elapsed_s']:.1f}s, "
+          f"{result['replies_per_sec']:.1f} replies/s, "
+          f"{result['sheet_requests']} sheet requests ({result['sheet_errors']} failed), "
+          f"{result['admin_messages']} admin messages")
+    print(f"{'kind':<14}{'replies':>9}{'timeouts':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for row in result["kinds"]:
+        p50 = f"{row['p50_ms']:.1f}" if row["p50_ms"] is not None else "-"
+        p99 = f"{row['p99_ms']:.1f}" if row["p99_ms"] is not None else "-"
+        print(f"{row['kind']:<14}{row['replies']:>9}{row['timeouts']:>10}{p50:>10}{p99:>10}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of steady load")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds to start all users")
+    parser.add_argument("--think", type=float, default=1.0, help="mean pause between requests, s")
+    parser.add_argument("--reply-timeout", type=float, default=30.0)
+    parser.add_argument("--rows", type=int, default=10000, help="rows in the fake sheet")
+    parser.add_argument("--sheet-latency", type=float, default=0.0,
+                        help="simulated seconds per Sheets request")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="share of Sheets requests failing with 429")
+    parser.add_argument("--quota", type=float, default=60.0,
+                        help="Sheets requests per minute allowed by the governor")
+    parser.add_argument("--admin-id", type=int, default=1,
+                        help="admin chat: booking alerts, start/stop notices (0 disables them)")
+    parser.add_argument("--digest-window", type=float, default=30.0,
+                        help="seconds over which admin alerts are merged")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    result = asyncio.run(main(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,271 @@
+"""
+HTTP API for the Mini App (served by the bot process)
+"""
+import logging
+import time
+from datetime import date
+from pathlib import Path
+from typing import Collection, Optional
+
+from aiogram.utils.web_app import safe_parse_webapp_init_data
+from aiohttp import web
+
+from bot import metrics
+from bot.services.aggregates import BookingAggregates
+from bot.services.availability import AvailabilityService, service_duration
+from bot.startup import StartupTracker
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_KEY = web.AppKey("availability", AvailabilityService)
+AGGREGATES_KEY = web.AppKey("aggregates", BookingAggregates)
+ADMIN_IDS_KEY = web.AppKey("admin_ids", frozenset)
+BOT_TOKEN_KEY = web.AppKey("bot_token", str)
+STARTUP_KEY = web.AppKey("startup", StartupTracker)
+
+# initData старше суток не принимаем
+INIT_DATA_MAX_AGE = 24 * 60 * 60
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler) -> web.StreamResponse:
+    """The web app is hosted on another origin (GitHub Pages etc.)"""
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, If-None-Match, X-Telegram-Init-Data"
+    response.headers["Access-Control-Expose-Headers"] = "ETag"
+    return response
+
+
+# Дальше двух месяцев форма записи дату выбрать не дает
+MAX_RANGE_DAYS = 62
+
+
+def _json_error(message: str, status: int = 400) -> web.Response:
+    return web.json_response({"success": False, "error": message}, status=status)
+
+
+def _cached_json(request: web.Request, payload: dict, etag: str) -> web.Response:
+    """JSON with an ETag; 304 if the client already has this version"""
+    if etag in request.headers.get("If-None-Match", ""):
+        response = web.Response(status=304)
+    else:
+        response = web.json_response(payload)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+async def get_availability(request: web.Request) -> web.Response:
+    """
+    GET /api/availability?date=YYYY-MM-DD[&service=...|&duration=minutes]
+    Busy bitmap of the day (bit i = slot i from `open`, `slot_minutes` each)
+    and, if a service or duration is given, the start times where it fits.
+    """
+    try:
+        day = date.fromisoformat(request.query.get("date", ""))
+    except ValueError:
+        return _json_error("date must be YYYY-MM-DD")
+
+    duration = None
+    if "duration" in request.query:
+        try:
+            duration = int(request.query["duration"])
+        except ValueError:
+            return _json_error("duration must be a number of minutes")
+    elif "service" in request.query:
+        duration = service_duration(request.query["service"])
+
+    availability = request.app[AVAILABILITY_KEY]
+    try:
+        result = await availability.day(day, duration)
+    except Exception as e:
+        logger.error(f"❌ Error building availability for {day}: {e!r}")
+        return _json_error("temporarily unavailable", status=503)
+    # Свободные слоты зависят от длительности, она входит в ETag
+    etag = result["etag"] if duration is None else f'{result["etag"][:-1]}-{duration}"'
+    return _cached_json(request, {"success": True, **result}, etag)
+
+
+async def get_availability_range(request: web.Request) -> web.Response:
+    """
+    GET /api/availability/range?from=YYYY-MM-DD&days=14
+    One busy bitmask and ETag per day; the whole response has an ETag too,
+    so an unchanged range costs a 304.
+    """
+    try:
+        start = date.fromisoformat(request.query.get("from") or date.today().isoformat())
+        days = int(request.query.get("days", 14))
+    except ValueError:
+        return _json_error("from must be YYYY-MM-DD, days a number")
+    if not 1 <= days <= MAX_RANGE_DAYS:
+        return _json_error(f"days must be between 1 and {MAX_RANGE_DAYS}")
+
+    availability = request.app[AVAILABILITY_KEY]
+    try:
+        result = await availability.days_range(start, days)
+    except Exception as e:
+        logger.error(f"❌ Error building availability from {start}: {e!r}")
+        return _json_error("temporarily unavailable", status=503)
+    return _cached_json(request, {"success": True, **result}, result["etag"])
+
+
+def _admin_user(request: web.Request) -> Optional[int]:
+    """
+    Telegram user ID of an admin from the Mini App initData
+    (X-Telegram-Init-Data header, signed with the bot token), else None
+    """
+    init_data = request.headers.get("X-Telegram-Init-Data", "")
+    try:
+        data = safe_parse_webapp_init_data(request.app[BOT_TOKEN_KEY], init_data)
+    except ValueError:
+        return None
+    if data.user is None or time.time() - data.auth_date.timestamp() > INIT_DATA_MAX_AGE:
+        return None
+    return data.user.id if data.user.id in request.app[ADMIN_IDS_KEY] else None
+
+
+async def get_admin_day(request: web.Request) -> web.Response:
+    """
+    GET /api/admin/day?date=YYYY-MM-DD
+    Bookings of the day by time from the local mirror, in the shape
+    admin.html gets from the Apps Script (row_index is null until the
+    booking is appended to the sheet)
+    """
+    if _admin_user(request) is None:
+        return _json_error("forbidden", status=403)
+    try:
+        day = date.fromisoformat(request.query.get("date", ""))
+    except ValueError:
+        return _json_error("date must be YYYY-MM-DD")
+
+    try:
+        rows = await request.app[AGGREGATES_KEY].day(day)
+    except Exception as e:
+        logger.error(f"❌ Error reading bookings for {day}: {e!r}")
+        return _json_error("temporarily unavailable", status=503)
+    bookings = [
+        {
+            "id": record.get("ID"),
+            "row_index": row,
+            "name": record.get("Name"),
+            "phone": record.get("Phone"),
+            "service": record.get("Service"),
+            "time_full": record.get("Visit Date/Time"),
+            "user_id": record.get("User ID"),
+            "username": record.get("Username"),
+        }
+        for row, record in rows
+    ]
+    return web.json_response({"success": True, "date": day.isoformat(), "bookings": bookings})
+
+
+async def get_admin_stats(request: web.Request) -> web.Response:
+    """
+    GET /api/admin/stats?from=YYYY-MM-DD&days=7
+    Bookings per day and a day x hour heatmap for the range, per-service
+    and per-hour totals; served from running counters
+    """
+    if _admin_user(request) is None:
+        return _json_error("forbidden", status=403)
+    try:
+        start = date.fromisoformat(request.query.get("from") or date.today().isoformat())
+        days = int(request.query.get("days", 7))
+    except ValueError:
+        return _json_error("from must be YYYY-MM-DD, days a number")
+    if not 1 <= days <= MAX_RANGE_DAYS:
+        return _json_error(f"days must be between 1 and {MAX_RANGE_DAYS}")
+
+    try:
+        result = await request.app[AGGREGATES_KEY].summary(start, days)
+    except Exception as e:
+        logger.error(f"❌ Error building booking stats from {start}: {e!r}")
+        return _json_error("temporarily unavailable", status=503)
+    return web.json_response({"success": True, **result})
+
+
+async def post_admin_refresh(request: web.Request) -> web.Response:
+    """
+    POST /api/admin/refresh
+    Full sheet sync after the admin edited or deleted rows through the
+    Apps Script, so the day view and counters catch up right away
+    """
+    user_id = _admin_user(request)
+    if user_id is None:
+        return _json_error("forbidden", status=403)
+    try:
+        await request.app[AGGREGATES_KEY].sheets.sync(full=True)
+    except Exception as e:
+        logger.error(f"❌ Error syncing after admin {user_id} changes: {e!r}")
+        return _json_error("temporarily unavailable", status=503)
+    return web.json_response({"success": True})
+
+
+async def get_health(request: web.Request) -> web.Response:
+    """
+    GET /health - readiness for the deploy: 200 once the bot receives
+    updates and has a local copy of the sheet, 503 before; the body has
+    the cold start milestones
+    """
+    sheets = request.app[AVAILABILITY_KEY].sheets
+    report = request.app[STARTUP_KEY].report(sheets)
+    return web.json_response(report, status=200 if report["ready"] else 503)
+
+
+async def get_metrics(request: web.Request) -> web.Response:
+    """GET /metrics - Prometheus scrape endpoint"""
+    return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+def create_app(
+    availability: AvailabilityService,
+    static_dir: Optional[Path] = None,
+    aggregates: Optional[BookingAggregates] = None,
+    admin_ids: Collection[int] = (),
+    bot_token: str = "",
+    startup: Optional[StartupTracker] = None
+) -> web.Application:
+    """
+    JSON API, plus the Mini App files under /webapp/ if static_dir is given
+    (the webhook handler is added to the same app in webhook mode).
+    The admin endpoints are added when aggregates are given, /health
+    when a startup tracker is.
+    """
+    app = web.Application(middlewares=[cors_middleware])
+    app[AVAILABILITY_KEY] = availability
+    app.router.add_get("/api/availability", get_availability)
+    app.router.add_get("/api/availability/range", get_availability_range)
+    app.router.add_get("/metrics", get_metrics)
+    if startup is not None:
+        app[STARTUP_KEY] = startup
+        app.router.add_get("/health", get_health)
+
+    if aggregates is not None:
+        app[AGGREGATES_KEY] = aggregates
+        app[ADMIN_IDS_KEY] = frozenset(admin_ids)
+        app[BOT_TOKEN_KEY] = bot_token
+        app.router.add_get("/api/admin/day", get_admin_day)
+        app.router.add_get("/api/admin/stats", get_admin_stats)
+        app.router.add_post("/api/admin/refresh", post_admin_refresh)
+
+    if static_dir is not None:
+        async def webapp_index(request: web.Request) -> web.FileResponse:
+            return web.FileResponse(static_dir / "index.html")
+
+        app.router.add_get("/webapp/", webapp_index)
+        app.router.add_static("/webapp/", static_dir)
+    return app
+
+
+async def start_api(app: web.Application, host: str, port: int) -> web.AppRunner:
+    """Run the API next to polling, returns the runner for cleanup"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"🌐 API listening on http://{host}:{port}")
+    return runner
@@ -0,0 +1,293 @@
+"""
+Bulk import and export of bookings
+
+    python -m bot.bulk import history.csv
+    python -m bot.bulk import history.jsonl --chunk 500
+    python -m bot.bulk export bookings.csv
+    python -m bot.bulk export bookings-2026-01.jsonl --month 2026-01
+
+Files use GoogleSheetsService.HEADERS as the schema: the CSV header row or
+the keys of every JSONL line. Rows without an ID, or with one the sheet
+already has, get one from the bot's booking counter; a missing Visit ISO
+is filled from Visit Date/Time.
+
+Import appends the file in chunks (one append_rows request each) and keeps
+a checkpoint next to it (<file>.checkpoint): an interrupted run started
+again continues after the last chunk that reached the sheet, without
+duplicating it. Export reads the sheet page by page and streams it to the
+file, memory use does not depend on the size of the sheet. Both go through
+the Sheets quota governor as background work, at their own rate (--quota).
+The running bot keeps spending its SHEETS_QUOTA_PER_MINUTE meanwhile, so
+choose --quota to keep the sum under the Google limit (429s are retried
+with backoff on both sides, but slow the bot down).
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from bot.config import config
+from bot.services.archive import visit_month
+from bot.services.google_sheets import GoogleSheetsService
+from bot.services.sheets_quota import PRIORITY_BACKGROUND
+from bot.services.visit_time import parse_visit_datetime, to_iso
+
+logger = logging.getLogger(__name__)
+
+HEADERS = GoogleSheetsService.HEADERS
+ID_COLUMN = HEADERS.index("ID")
+VISIT_COLUMN = HEADERS.index("Visit Date/Time")
+ISO_COLUMN = HEADERS.index("Visit ISO")
+
+
+def file_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    raise ValueError(f"{path}: expected a .csv or .jsonl file")
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """Records of a CSV/JSONL file one by one"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if file_format(path) == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        reader = csv.DictReader(f)
+        unknown = set(reader.fieldnames or ()) - set(HEADERS)
+        if unknown:
+            raise ValueError(f"{path}: unknown columns {sorted(unknown)}, expected {HEADERS}")
+        yield from reader
+
+
+def file_ids(path: str) -> Iterator[str]:
+    """IDs given in the file, one per record ("" if none)"""
+    for record in read_records(path):
+        yield "" if record.get("ID") is None else str(record["ID"]).strip()
+
+
+def to_row(record: Dict) -> List[str]:
+    """Record -> sheet row in HEADERS order"""
+    row = ["" if record.get(header) is None else str(record[header]) for header in HEADERS]
+    if not row[ISO_COLUMN]:
+        visit_dt = parse_visit_datetime(row[VISIT_COLUMN])
+        row[ISO_COLUMN] = to_iso(visit_dt) if visit_dt else ""
+    return row
+
+
+class Checkpoint:
+    """
+    Progress of an import: records of the source already in the sheet and
+    the IDs of the chunk being appended, with the number of ID cells the
+    sheet had before it (written before the request, so a crash in between
+    can be told apart from a failed append)
+    """
+
+    def __init__(self, source: str, chunk: int):
+        self.path = f"{source}.checkpoint"
+        stat = os.stat(source)
+        self.source = [os.path.abspath(source), stat.st_size, int(stat.st_mtime)]
+        self.chunk = chunk
+        self.done = 0
+        self.pending: List[str] = []
+        self.pending_after = 0
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["source"] != self.source:
+                raise ValueError(f"{source} changed since {self.path} was written, delete it to start over")
+            if data["chunk"] != chunk:
+                raise ValueError(f"{self.path} was written with --chunk {data['chunk']}, resume with the same value")
+            self.done = data["done"]
+            self.pending = data["pending"]
+            self.pending_after = data["pending_after"]
+
+    def save(self) -> None:
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": self.source,
+                "chunk": self.chunk,
+                "done": self.done,
+                "pending": self.pending,
+                "pending_after": self.pending_after,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def pending_landed(checkpoint: Checkpoint, sheet_ids: Sequence[str]) -> bool:
+    """
+    Whether the chunk of an interrupted run reached the sheet: all of its
+    IDs are in the rows appended after the checkpoint was written
+    (one append_rows request lands whole or not at all)
+    """
+    appended = set(sheet_ids[checkpoint.pending_after:])
+    found = sum(booking_id in appended for booking_id in checkpoint.pending)
+    if found and found != len(checkpoint.pending):
+        raise RuntimeError(
+            f"{found} of {len(checkpoint.pending)} rows of the interrupted chunk are in the sheet, "
+            f"check the sheet and {checkpoint.path} by hand"
+        )
+    return found > 0
+
+
+async def import_file(sheets: GoogleSheetsService, path: str, chunk: int = 500) -> int:
+    """
+    Append the bookings of a CSV/JSONL file to the sheet, returns rows written.
+    An ID from the file is kept unless the sheet (or an earlier record of
+    the file) already has it; such rows get a new ID from the counter.
+    """
+    checkpoint = Checkpoint(path, chunk)
+    sheet_ids = (await sheets.read_columns(["ID"], priority=PRIORITY_BACKGROUND))["ID"]
+    # Новые ID не должны совпасть ни с таблицей, ни с ID из самого файла
+    sheets.store.reserve_booking_ids(max(
+        (int(value) for value in itertools.chain(sheet_ids, file_ids(path)) if value.isdigit()),
+        default=0
+    ))
+    if checkpoint.pending:
+        # Прошлый запуск оборвался во время записи: проверяем, дошла ли пачка
+        if pending_landed(checkpoint, sheet_ids):
+            logger.info(f"↩️ Last chunk of {len(checkpoint.pending)} rows is already in the sheet")
+            checkpoint.done += chunk
+            checkpoint.pending = []
+            checkpoint.save()
+    if checkpoint.done:
+        logger.info(f"↩️ Resuming {path} after {checkpoint.done} records")
+
+    taken = set(sheet_ids) - {""}
+    id_cells = len(sheet_ids)
+    records = itertools.islice(read_records(path), checkpoint.done, None)
+    written = 0
+    renumbered = 0
+    while True:
+        batch = list(itertools.islice(records, chunk))
+        if not batch:
+            break
+        rows = [row for row in map(to_row, batch) if any(row)]
+        # При повторе пачки - те же ID, что и в первый раз
+        ids = checkpoint.pending
+        if not ids:
+            for row in rows:
+                booking_id = row[ID_COLUMN]
+                if not booking_id or booking_id in taken:
+                    renumbered += bool(booking_id)
+                    booking_id = str(sheets.store.next_booking_id())
+                taken.add(booking_id)
+                ids.append(booking_id)
+        for row, booking_id in zip(rows, ids):
+            row[ID_COLUMN] = booking_id
+        checkpoint.pending = ids
+        checkpoint.pending_after = id_cells
+        checkpoint.save()
+
+        if rows:
+            await sheets.append_bulk(rows)
+        checkpoint.done += len(batch)
+        checkpoint.pending = []
+        checkpoint.save()
+        written += len(rows)
+        id_cells += len(rows)
+        logger.info(f"📥 {checkpoint.done} records of {path} imported")
+
+    if renumbered:
+        logger.warning(f"⚠️ {renumbered} records of {path} got new IDs: theirs were already taken")
+    checkpoint.remove()
+    return written
+
+
+async def export_file(
+    sheets: GoogleSheetsService,
+    path: str,
+    month: Optional[str] = None,
+    page: int = 1000
+) -> int:
+    """
+    Stream the sheet (or the visits of one YYYY-MM month) to a CSV/JSONL
+    file, returns rows written. The file appears only once it is complete.
+    Pages cover the worksheet grid as it is when the export starts, so
+    blocks of cleared rows do not end it early.
+    """
+    as_jsonl = file_format(path) == "jsonl"
+    tmp = f"{path}.part"
+    written = 0
+    first_row = 2
+    last_row = await sheets.row_count()
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        if not as_jsonl:
+            writer.writerow(HEADERS)
+        while first_row <= last_row:
+            values = await sheets.read_page(first_row, min(page, last_row - first_row + 1))
+            for row in values:
+                if not any(row):
+                    continue
+                row = list(row) + [""] * (len(HEADERS) - len(row))
+                if month and visit_month(row[VISIT_COLUMN], row[ISO_COLUMN]) != month:
+                    continue
+                if as_jsonl:
+                    f.write(json.dumps(dict(zip(HEADERS, row)), ensure_ascii=False) + "\n")
+                else:
+                    writer.writerow(row)
+                written += 1
+            first_row += page
+            logger.info(f"📤 {min(first_row, last_row + 1) - 2} rows read, {written} exported")
+    os.replace(tmp, path)
+    return written
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quota", type=float, default=config.sheets_quota_per_minute / 2,
+                        help="Sheets requests per minute for this run, on top of what the running "
+                             "bot spends (default: half of SHEETS_QUOTA_PER_MINUTE)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="append a CSV/JSONL file to the sheet")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--chunk", type=int, default=500, help="rows per append request")
+
+    export_parser = commands.add_parser("export", help="write the sheet to a CSV/JSONL file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--month", help="only visits of this month, YYYY-MM")
+    export_parser.add_argument("--page", type=int, default=1000, help="rows per read request")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> None:
+    # Та же база, что у бота: ID для строк без ID берутся из общего счетчика
+    sheets = GoogleSheetsService(
+        config.credentials_file,
+        config.google_sheet_name,
+        max_workers=2,
+        timeout=config.sheets_timeout,
+        db_path=config.bookings_db,
+        quota_per_minute=args.quota
+    )
+    try:
+        if args.command == "import":
+            written = await import_file(sheets, args.path, args.chunk)
+            logger.info(f"✅ Imported {written} bookings from {args.path}")
+        else:
+            written = await export_file(sheets, args.path, args.month, args.page)
+            logger.info(f"✅ Exported {written} bookings to {args.path}")
+    finally:
+        sheets.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    asyncio.run(main(parse_args()))
@@ -3,6 +3,7 @@ Bot Configuration
 """
 import os
 from dataclasses import dataclass
+from urllib.parse import quote
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,15 +17,89 @@ class Config:
     webapp_url: str
     google_sheet_name: str
     credentials_file: str = "credentials.json"
+    sheets_workers: int = 4
+    sheets_timeout: float = 15.0
+    sheets_quota_per_minute: float = 60.0
+    bookings_db: str = "bookings.db"
+    sync_interval: float = 60.0
+    sync_full_every: int = 30
+    sync_max_staleness: float = 180.0  # чтение старше этого синхронизирует копию
+    write_batch_size: int = 50
+    write_flush_delay: float = 2.0
+    reminder_reconcile_interval: float = 600.0
+    delivery_workers: int = 8
+    telegram_global_rate: float = 25.0
+    telegram_chat_rate: float = 1.0
+    admin_digest_window: float = 30.0
+    page_cache_users: int = 2048
+    page_cache_ttl: float = 300.0
+    startup_mode: str = "background"  # background | blocking
+    api_host: str = "127.0.0.1"  # наружу - только через HTTPS-прокси
+    api_port: int = 8080
+    api_public_url: str = ""  # публичный адрес API для web app (?api=...)
+    serve_webapp: bool = True
+    bot_mode: str = "polling"  # polling | webhook
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""  # обязателен в режиме webhook (A-Z, a-z, 0-9, _ и -)
+    webhook_workers: int = 16
+    trace_updates: bool = False
+    archive_enabled: bool = False
+    archive_dir: str = "archive"
+    archive_interval: float = 21600.0
+    
+    def with_api(self, url: str) -> str:
+        """Mini App page URL with the bot API address passed as ?api=..."""
+        if not self.api_public_url:
+            return url
+        separator = "&" if "?" in url else "?"
+        return f"{url}{separator}api={quote(self.api_public_url, safe='')}"
+    
+    @property
+    def webapp_launch_url(self) -> str:
+        """Web App URL with the bot API address passed as ?api=..."""
+        return self.with_api(self.webapp_url)
     
     @classmethod
     def from_env(cls) -> "Config":
         """Load configuration from environment variables"""
+        sync_interval = float(os.getenv("SYNC_INTERVAL", 60))
         return cls(
             bot_token=os.getenv("BOT_TOKEN", ""),
             admin_id=int(os.getenv("ADMIN_ID", 0)),
             webapp_url=os.getenv("WEBAPP_URL", ""),
             google_sheet_name=os.getenv("GOOGLE_SHEET_NAME", "Client Bookings"),
+            sheets_workers=int(os.getenv("SHEETS_WORKERS", 4)),
+            sheets_timeout=float(os.getenv("SHEETS_TIMEOUT", 15)),
+            sheets_quota_per_minute=float(os.getenv("SHEETS_QUOTA_PER_MINUTE", 60)),
+            bookings_db=os.getenv("BOOKINGS_DB", "bookings.db"),
+            sync_interval=sync_interval,
+            sync_full_every=int(os.getenv("SYNC_FULL_EVERY", 30)),
+            # По умолчанию - три интервала: фоновый цикл успевает раньше чтений
+            sync_max_staleness=float(os.getenv("SYNC_MAX_STALENESS", 3 * sync_interval)),
+            write_batch_size=int(os.getenv("WRITE_BATCH_SIZE", 50)),
+            write_flush_delay=float(os.getenv("WRITE_FLUSH_DELAY", 2)),
+            reminder_reconcile_interval=float(os.getenv("REMINDER_RECONCILE_INTERVAL", 600)),
+            delivery_workers=int(os.getenv("DELIVERY_WORKERS", 8)),
+            telegram_global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", 25)),
+            telegram_chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", 1)),
+            admin_digest_window=float(os.getenv("ADMIN_DIGEST_WINDOW", 30)),
+            page_cache_users=int(os.getenv("PAGE_CACHE_USERS", 2048)),
+            page_cache_ttl=float(os.getenv("PAGE_CACHE_TTL", 300)),
+            startup_mode=os.getenv("STARTUP_MODE", "background").lower(),
+            api_host=os.getenv("API_HOST", "127.0.0.1"),
+            api_port=int(os.getenv("API_PORT", 8080)),
+            api_public_url=os.getenv("API_PUBLIC_URL", ""),
+            serve_webapp=os.getenv("SERVE_WEBAPP", "1") == "1",
+            bot_mode=os.getenv("BOT_MODE", "polling").lower(),
+            webhook_url=os.getenv("WEBHOOK_URL", "").rstrip("/"),
+            webhook_path=os.getenv("WEBHOOK_PATH", "/webhook"),
+            webhook_secret=os.getenv("WEBHOOK_SECRET", ""),
+            webhook_workers=int(os.getenv("WEBHOOK_WORKERS", 16)),
+            trace_updates=os.getenv("TRACE_UPDATES", "0") == "1",
+            archive_enabled=os.getenv("ARCHIVE_ENABLED", "0") == "1",
+            archive_dir=os.getenv("ARCHIVE_DIR", "archive"),
+            archive_interval=float(os.getenv("ARCHIVE_INTERVAL", 21600)),
         )
 
 
@@ -16,7 +16,8 @@ async def admin_panel(message: Message):
     # Генерация ссылки на admin.html
     # Если webapp_url = https://site.com/index.html, превращаем в https://site.com/admin.html
     base_url = config.webapp_url.rsplit('/', 1)[0]
-    admin_url = f"{base_url}/admin.html"
+    # С ?api= админка берет записи дня и статистику у бота, а не у Apps Script
+    admin_url = config.with_api(f"{base_url}/admin.html")
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🔐 Відкрити Адмін Панель", web_app=WebAppInfo(url=admin_url))]
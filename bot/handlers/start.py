@@ -1,7 +1,11 @@
 """
 Reply Keyboard Handler for /start command
 """
+import logging
+from contextlib import suppress
+from typing import Optional, Tuple
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import CommandStart, Command
 from aiogram.types import (
     Message, 
@@ -9,17 +13,17 @@ from aiogram.types import (
     KeyboardButton, 
     WebAppInfo,
     InlineKeyboardMarkup,
-    InlineKeyboardButton
+    InlineKeyboardButton,
+    CallbackQuery
 )
 from bot.config import config
 # Import the Google Sheets Service
 from bot.services.google_sheets import GoogleSheetsService
+from bot.services.page_cache import UserPageCache
+from bot.services.visit_time import record_visit_datetime
 
 router = Router(name="start")
-
-# Initialize the Google Sheets Service
-# This allows us to check bookings in the handlers below
-sheets_service = GoogleSheetsService(config.credentials_file, config.google_sheet_name)
+logger = logging.getLogger(__name__)
 
 
 def get_webapp_keyboard() -> ReplyKeyboardMarkup:
@@ -32,7 +36,7 @@ def get_webapp_keyboard() -> ReplyKeyboardMarkup:
             [
                 KeyboardButton(
                     text="📝 Записатися",
-                    web_app=WebAppInfo(url=config.webapp_url)
+                    web_app=WebAppInfo(url=config.webapp_launch_url)
                 )
             ],
             [
@@ -124,51 +128,140 @@ async def handle_about(message: Message) -> None:
     await message.answer(about_text, parse_mode="HTML")
 
 
+# How many upcoming bookings to show per message
+BOOKINGS_PAGE_SIZE = 5
+
+
+def format_bookings_page(
+    bookings: list,
+    total: int,
+    offset: int
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Text and 'show more' button for one page of upcoming bookings"""
+    response_text = "📋 <b>Ваші активні записи:</b>\n" if offset == 0 else ""
+    
+    for booking in bookings:
+        # Get data from dictionary (keys match Google Sheet headers)
+        service = booking.get("Service", "Service")
+        date_time = booking.get("Visit Date/Time", "Time not specified")
+        
+        response_text += f"\n🔹 <b>{service}</b>"
+        response_text += f"\n🕒 {date_time}"
+        response_text += "\n───────────────"
+    
+    next_offset = offset + len(bookings)
+    if next_offset >= total:
+        return response_text, None
+    
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text=f"⬇️ Показати ще ({total - next_offset})",
+                    callback_data=f"my_bookings:{next_offset}"
+                )
+            ]
+        ]
+    )
+    return response_text, keyboard
+
+
+async def get_bookings_page(
+    sheets: GoogleSheetsService,
+    cache: UserPageCache,
+    user_id: int,
+    offset: int
+) -> Tuple[Optional[str], Optional[InlineKeyboardMarkup]]:
+    """
+    Rendered page of upcoming bookings, (None, None) if there are none.
+    Repeat presses are answered from the cache.
+    """
+    page = cache.get(user_id, offset)
+    if page is not None:
+        return page
+    
+    # Upcoming bookings from the user index in the local mirror
+    bookings, total = await sheets.get_upcoming_bookings_by_user(
+        user_id, limit=BOOKINGS_PAGE_SIZE, offset=offset
+    )
+    page = format_bookings_page(bookings, total, offset) if bookings else (None, None)
+    # The list changes by itself once the nearest visit has passed
+    nearest = record_visit_datetime(bookings[0]) if bookings else None
+    cache.put(user_id, offset, page, expires=nearest.timestamp() if nearest else None)
+    return page
+
+
 @router.message(F.text == "📋 Мої записи")
-async def handle_my_bookings(message: Message) -> None:
-    """Handler for 'My Bookings' button - REAL DATA CHECK"""
+async def handle_my_bookings(
+    message: Message,
+    sheets: GoogleSheetsService,
+    page_cache: UserPageCache
+) -> None:
+    """
+    Handler for 'My Bookings' button - REAL DATA CHECK
+    `sheets` and `page_cache` are shared services from the dispatcher workflow data
+    """
     
     # 1. Get the Telegram User ID
     user_id = message.from_user.id
     
     try:
-        # 2. Request bookings from Google Sheets
-        bookings = sheets_service.get_bookings_by_user(user_id)
+        # 2. Rendered first page (cached per user)
+        response_text, keyboard = await get_bookings_page(sheets, page_cache, user_id, 0)
         
         # 3. If no bookings found
-        if not bookings:
+        if response_text is None:
             await message.answer(
                 "📂 <b>У вас поки немає активних записів.</b>",
                 parse_mode="HTML"
             )
             return
 
-        # 4. If bookings exist, format the message
-        response_text = "📋 <b>Ваші активні записи:</b>\n"
-        
-        for booking in bookings:
-            # Get data from dictionary (keys match Google Sheet headers)
-            service = booking.get("Service", "Service")
-            date_time = booking.get("Visit Date/Time", "Time not specified")
-            
-            response_text += f"\n🔹 <b>{service}</b>"
-            response_text += f"\n🕒 {date_time}"
-            response_text += "\n───────────────"
-
-        await message.answer(response_text, parse_mode="HTML")
+        # 4. If bookings exist, send the page
+        await message.answer(response_text, parse_mode="HTML", reply_markup=keyboard)
 
     except Exception as e:
         # Error handling (e.g., connection issue)
-        import traceback
-        print("❌ КРИТИЧЕСКАЯ ОШИБКА В MY BOOKINGS:")
-        print(e)
-        print(traceback.format_exc())
+        logger.exception(f"❌ Error loading bookings of {user_id}: {e!r}")
         await message.answer(
             "⚠️ <b>Помилка отримання даних.</b>\nСпробуйте пізніше.",
             parse_mode="HTML"
         )
 
 
+@router.callback_query(F.data.startswith("my_bookings:"))
+async def handle_my_bookings_page(
+    callback: CallbackQuery,
+    sheets: GoogleSheetsService,
+    page_cache: UserPageCache
+) -> None:
+    """Next page of 'My Bookings'"""
+    try:
+        offset = int(callback.data.split(":", 1)[1])
+        if offset < 0:
+            raise ValueError(f"negative offset {offset}")
+    except ValueError as e:
+        logger.warning(f"⚠️ Bad bookings page callback {callback.data!r}: {e!r}")
+        await callback.answer()
+        return
+    
+    try:
+        response_text, keyboard = await get_bookings_page(
+            sheets, page_cache, callback.from_user.id, offset
+        )
+    except Exception as e:
+        logger.error(f"❌ Error loading bookings page: {e!r}")
+        await callback.answer("⚠️ Помилка отримання даних. Спробуйте пізніше.", show_alert=True)
+        return
+    
+    # Hide the button on the previous page (too old to edit - leave it)
+    with suppress(TelegramBadRequest):
+        await callback.message.edit_reply_markup(reply_markup=None)
+    if response_text is not None:
+        await callback.message.answer(response_text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
+
 @router.message(Command("menu"))
 async def cmd_menu(message: Message) -> None:
     """Show main menu"""
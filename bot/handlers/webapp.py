@@ -3,20 +3,20 @@ Handler for Web App data
 """
 import json
 import logging
-from aiogram import Router, F, Bot
+from aiogram import Router, F
 from aiogram.types import Message
-from bot.config import config
+from bot.services.availability import (
+    AvailabilityService,
+    SlotUnavailableError,
+    service_duration,
+)
 from bot.services.google_sheets import GoogleSheetsService
+from bot.services.notifications import AdminNotifier
+from bot.services.visit_time import parse_visit_datetime
 
 router = Router(name="webapp")
 logger = logging.getLogger(__name__)
 
-# Initialize Google Sheets service
-sheets_service = GoogleSheetsService(
-    credentials_file=config.credentials_file,
-    sheet_name=config.google_sheet_name
-)
-
 
 def format_booking_message(booking: dict, user_info: str = "") -> str:
     """Format booking message"""
@@ -33,7 +33,12 @@ def format_booking_message(booking: dict, user_info: str = "") -> str:
 
 
 @router.message(F.web_app_data)
-async def handle_webapp_data(message: Message, bot: Bot) -> None:
+async def handle_webapp_data(
+    message: Message,
+    sheets: GoogleSheetsService,
+    availability: AvailabilityService,
+    notifier: AdminNotifier
+) -> None:
     """Handle data from Web App"""
     
     try:
@@ -51,15 +56,32 @@ async def handle_webapp_data(message: Message, bot: Bot) -> None:
                 )
                 return
         
-        # Save to Google Sheets
-        booking = await sheets_service.add_booking(
-            name=data['name'],
-            phone=data['phone'],
-            service=data['service'],
-            date_time=data['datetime'],
-            user_id=message.from_user.id,
-            username=message.from_user.username or ""
-        )
+        visit_dt = parse_visit_datetime(data['datetime'])
+        if visit_dt is None:
+            await message.answer("❌ Помилка: некоректна дата або час запису")
+            return
+        
+        # Save to Google Sheets, holding the slots so two clients
+        # cannot book the same time while the write is in progress
+        try:
+            async with availability.reserve(visit_dt, service_duration(data['service'])):
+                booking = await sheets.add_booking(
+                    name=data['name'],
+                    phone=data['phone'],
+                    service=data['service'],
+                    date_time=data['datetime'],
+                    user_id=message.from_user.id,
+                    username=message.from_user.username or ""
+                )
+        except SlotUnavailableError as e:
+            logger.info(f"⛔ Slot rejected for {message.from_user.id}: {data['datetime']} ({e})")
+            await message.answer(
+                "⛔ <b>Цей час уже недоступний.</b>\n\n"
+                f"📅 {data['datetime']} — {data['service']}\n"
+                "Будь ласка, відкрийте форму ще раз і оберіть інший час.",
+                parse_mode="HTML"
+            )
+            return
         
         # Confirmation to user
         user_message = f"""
@@ -86,15 +108,9 @@ async def handle_webapp_data(message: Message, bot: Bot) -> None:
         admin_message = format_booking_message(booking, user_info)
         admin_message += "\n━━━━━━━━━━━━━━━━━━━━━━"
         
-        try:
-            await bot.send_message(
-                chat_id=config.admin_id,
-                text=admin_message,
-                parse_mode="HTML"
-            )
-            logger.info(f"✅ Notification sent to admin (ID: {config.admin_id})")
-        except Exception as e:
-            logger.error(f"❌ Error sending notification to admin: {e}")
+        # Queued: the handler does not wait for the admin send,
+        # bursts are merged into one digest
+        notifier.notify(booking, admin_message)
         
     except json.JSONDecodeError as e:
         logger.error(f"❌ JSON parsing error: {e}")
@@ -1,55 +1,203 @@
 """
 Main bot file
 """
+import time
+# Отсчет холодного старта - до всех остальных импортов
+STARTED = time.perf_counter()
+
 import asyncio
 import logging
+import signal
 import sys
+from contextlib import suppress
+from pathlib import Path
+from typing import List
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from bot.config import config
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from bot.config import Config, config
 
 # 🔥 ИМПОРТИРУЕМ НУЖНЫЕ МОДУЛИ
 from bot.handlers import setup_routers, admin
 from bot.reminders import ReminderSystem
+from bot.api import create_app, start_api
+from bot import metrics
+from bot.middlewares import (
+    ConcurrencyLimitMiddleware,
+    FirstReplyMiddleware,
+    HandlerMetricsMiddleware,
+    MetricsMiddleware,
+)
+from bot.services.aggregates import BookingAggregates
+from bot.services.archive import BookingArchive
+from bot.services.availability import AvailabilityService
+from bot.services.delivery import DeliveryService
 from bot.services.google_sheets import GoogleSheetsService
+from bot.services.notifications import AdminNotifier
+from bot.services.page_cache import UserPageCache
+from bot.services.reminder_ledger import ReminderLedger
+from bot.startup import StartupTracker, warm_up
 
-# Logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# Файлы Mini App (index.html, admin.html, script.js, style.css)
+WEBAPP_DIR = Path(__file__).resolve().parent.parent / "webapp"
 
-async def on_startup(bot: Bot) -> None:
+
+async def on_startup(bot: Bot, delivery: DeliveryService, settings: Config) -> None:
     """Actions on bot startup"""
     bot_info = await bot.get_me()
     logger.info(f"🚀 Bot @{bot_info.username} started!")
     
-    try:
-        await bot.send_message(
-            chat_id=config.admin_id,
-            text="🟢 Бот успішно запущений і готовий до роботи!"
+    if settings.admin_id:
+        delivery.submit(
+            settings.admin_id,
+            "🟢 Бот успішно запущений і готовий до роботи!"
         )
-    except Exception as e:
-        logger.warning(f"Failed to send notification to admin: {e}")
 
 
-async def on_shutdown(bot: Bot) -> None:
+async def on_shutdown(delivery: DeliveryService, settings: Config) -> None:
     """Actions on bot shutdown"""
     logger.info("🔴 Bot stopped")
-    try:
-        await bot.send_message(
-            chat_id=config.admin_id,
-            text="🔴 Бот зупинений"
+    if settings.admin_id:
+        # Ждем отправки: после этого пул доставки останавливается
+        await delivery.send(settings.admin_id, "🔴 Бот зупинений", priority=0)
+
+
+class BotServices:
+    """
+    The dispatcher with every service, middleware and hook wired in.
+
+    main() builds it around the real Google Sheets service; the benchmarks
+    build the same thing around the in-memory sheet and a local Bot API,
+    so they measure what actually runs in production.
+    """
+    
+    def __init__(
+        self,
+        bot: Bot,
+        sheets_service: GoogleSheetsService,
+        startup: StartupTracker,
+        settings: Config = config
+    ):
+        self.bot = bot
+        self.sheets = sheets_service
+        self.startup = startup
+        self.settings = settings
+        self._tasks: List[asyncio.Task] = []
+        
+        # Все исходящие уведомления идут через пул с лимитами Telegram
+        self.delivery = DeliveryService(
+            bot,
+            workers=settings.delivery_workers,
+            global_rate=settings.telegram_global_rate,
+            per_chat_rate=settings.telegram_chat_rate
+        )
+        # Уведомления админу о записях: при наплыве - одним дайджестом за окно
+        self.notifier = AdminNotifier(
+            self.delivery, settings.admin_id, window=settings.admin_digest_window
+        )
+        # Занятость слотов: API для web app и проверка при записи
+        self.availability = AvailabilityService(sheets_service)
+        # Счетчики записей по дням, услугам и часам для админки
+        self.aggregates = BookingAggregates(sheets_service)
+        # Готовые страницы "Мої записи" по пользователям
+        self.page_cache = UserPageCache(
+            sheets_service, max_users=settings.page_cache_users, ttl=settings.page_cache_ttl
+        )
+        
+        # Система напоминаний (журнал отправленных напоминаний живет в той же базе)
+        self.reminder_ledger = ReminderLedger(settings.bookings_db)
+        self.reminder_system = ReminderSystem(
+            self.delivery,
+            sheets_service,
+            self.reminder_ledger,
+            reconcile_interval=settings.reminder_reconcile_interval
         )
-    except Exception:
-        pass
+        
+        # Хендлеры получают сервисы как аргументы `sheets`, `delivery`, `availability`,
+        # `notifier` и `page_cache`
+        self.dp = dp = Dispatcher()
+        dp["sheets"] = sheets_service
+        dp["delivery"] = self.delivery
+        dp["availability"] = self.availability
+        dp["notifier"] = self.notifier
+        dp["page_cache"] = self.page_cache
+        dp["settings"] = settings
+        
+        # Регистрируем роутеры (ВКЛЮЧАЯ АДМИНКУ)
+        dp.include_router(setup_routers())
+        dp.include_router(admin.router)  # <-- Важно! Без этого /admin не работает
+        
+        # Метрики: время апдейтов и хендлеров, очереди - снимаются при запросе /metrics
+        dp.update.outer_middleware(MetricsMiddleware(trace=settings.trace_updates))
+        dp.message.middleware(HandlerMetricsMiddleware())
+        dp.callback_query.middleware(HandlerMetricsMiddleware())
+        metrics.REMINDERS_SCHEDULED.set_function(lambda: self.reminder_system.pending)
+        metrics.DELIVERY_QUEUE.set_function(lambda: self.delivery.stats()["queue_depth"])
+        metrics.OUTBOX_PENDING.set_function(sheets_service.store.pending_count)
+        metrics.SHEETS_WAITING.set_function(lambda: sheets_service.governor.stats()["waiting"])
+        metrics.BOT_READY.set_function(lambda: float(startup.is_ready(sheets_service)))
+        dp.update.outer_middleware(FirstReplyMiddleware(startup))
+        
+        # Register events
+        dp.startup.register(on_startup)
+        dp.shutdown.register(on_shutdown)
+        dp.startup.register(self.on_updates_started)
+    
+    def _spawn(self, coro) -> None:
+        self._tasks.append(asyncio.create_task(coro))
+    
+    def start(self) -> None:
+        """Start delivery and the journal flush (before updates can arrive)"""
+        self.delivery.start()
+        self.notifier.start()
+        # Записи сначала попадают в локальный журнал, в таблицу уходят пачками
+        self._spawn(
+            self.sheets.flush_forever(self.settings.write_batch_size, self.settings.write_flush_delay)
+        )
+    
+    async def run_background(self) -> None:
+        """
+        Warm-up (Google connect, sync, slots), then the background loops:
+        reminders, mirror sync, token refresh, archive
+        """
+        settings = self.settings
+        await warm_up(self.sheets, self.availability, self.startup)
+        self._spawn(self.reminder_system.start())
+        self._spawn(
+            self.sheets.sync_forever(settings.sync_interval, settings.sync_full_every, first_cycle=1)
+        )
+        self._spawn(self.sheets.keep_alive())
+        if self.sheets.archive is not None:
+            self._spawn(self.sheets.archive_forever(settings.archive_interval))
+    
+    async def on_updates_started(self) -> None:
+        if self.settings.bot_mode == "polling":
+            self.startup.mark("polling")
+        # По умолчанию первые апдейты не ждут прогрева
+        if self.settings.startup_mode != "blocking":
+            self._spawn(self.run_background())
+    
+    async def shutdown(self) -> None:
+        """Stop the loops, flush what is left and stop delivery"""
+        self.reminder_system.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Пытаемся дописать журнал; что не успели - допишется после рестарта
+        try:
+            await self.sheets.flush_pending(self.settings.write_batch_size)
+        except Exception as e:
+            logger.warning(f"Failed to flush pending bookings: {e!r}")
+        await self.notifier.stop()
+        await self.delivery.stop()
+        logger.info(f"📬 Delivery stats: {self.delivery.stats()}")
+        logger.info(f"🗂 My bookings cache stats: {self.page_cache.stats()}")
+        logger.info(f"📊 Sheets quota stats: {self.sheets.governor.stats()}")
+        self.reminder_ledger.close()
 
 
 async def main() -> None:
@@ -67,47 +215,119 @@ async def main() -> None:
         logger.error("❌ WEBAPP_URL not specified in .env file!")
         return
     
+    if config.bot_mode == "webhook" and not config.webhook_url:
+        logger.error("❌ WEBHOOK_URL not specified in .env file (BOT_MODE=webhook)!")
+        return
+    
+    # Без секрета aiogram принимает любой POST на webhook - поддельные апдейты
+    if config.bot_mode == "webhook" and not config.webhook_secret:
+        logger.error("❌ WEBHOOK_SECRET not specified in .env file (BOT_MODE=webhook)!")
+        return
+    
+    startup = StartupTracker(STARTED)
+    startup.mark("imports")
+    
     # Initialize bot
     bot = Bot(
         token=config.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
-    # Initialize dispatcher
-    dp = Dispatcher()
-    
     # --- 🔥 НОВЫЙ БЛОК: ИНИЦИАЛИЗАЦИЯ СЕРВИСОВ ---
-    # 1. Подключаем таблицы
-    sheets_service = GoogleSheetsService(config.credentials_file, config.google_sheet_name)
+    # 1. Подключаем таблицы (один экземпляр на весь процесс,
+    #    соединение открывается лениво при первом обращении)
+    #    Прошлые месяцы по желанию уходят из таблицы в архив
+    archive = (
+        BookingArchive(config.archive_dir, config.bookings_db, GoogleSheetsService.HEADERS)
+        if config.archive_enabled else None
+    )
+    sheets_service = GoogleSheetsService(
+        config.credentials_file,
+        config.google_sheet_name,
+        max_workers=config.sheets_workers,
+        timeout=config.sheets_timeout,
+        db_path=config.bookings_db,
+        max_staleness=config.sync_max_staleness,
+        quota_per_minute=config.sheets_quota_per_minute,
+        archive=archive
+    )
     
-    # 2. Создаем систему напоминаний
-    reminder_system = ReminderSystem(bot, sheets_service)
+    # 2. Сервисы, напоминания, роутеры, middleware и хуки - см. BotServices
+    services = BotServices(bot, sheets_service, startup)
+    dp = services.dp
+    services.start()
     
-    # 3. Регистрируем роутеры (ВКЛЮЧАЯ АДМИНКУ)
-    dp.include_router(setup_routers())
-    dp.include_router(admin.router)  # <-- Важно! Без этого /admin не работает
+    # 3. HTTP-сервер: API для web app, статика webapp/ и (в режиме webhook) апдейты
+    app = create_app(
+        services.availability,
+        static_dir=WEBAPP_DIR if config.serve_webapp else None,
+        aggregates=services.aggregates,
+        admin_ids={*admin.ADMIN_IDS, config.admin_id} - {0},
+        bot_token=config.bot_token,
+        startup=startup
+    )
+    if config.bot_mode == "webhook":
+        dp.update.outer_middleware(ConcurrencyLimitMiddleware(config.webhook_workers))
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=config.webhook_secret
+        ).register(app, path=config.webhook_path)
+        # startup/shutdown диспетчера вызываются вместе с aiohttp-приложением
+        setup_application(app, dp, bot=bot)
+    api_runner = await start_api(app, config.api_host, config.api_port)
+    startup.mark("api")
     
-    # 4. Запускаем напоминания в фоне
-    asyncio.create_task(reminder_system.start())
+    if config.startup_mode == "blocking":
+        await services.run_background()
     # ---------------------------------------------
     
-    # Register events
-    dp.startup.register(on_startup)
-    dp.shutdown.register(on_shutdown)
-    
-    # Start bot
-    logger.info("🔄 Starting bot...")
-    
     try:
-        await dp.start_polling(
-            bot,
-            allowed_updates=dp.resolve_used_update_types()
-        )
+        if config.bot_mode == "webhook":
+            logger.info(f"🔄 Starting bot in webhook mode: {config.webhook_url}{config.webhook_path}")
+            await bot.set_webhook(
+                url=f"{config.webhook_url}{config.webhook_path}",
+                secret_token=config.webhook_secret,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            startup.mark("polling")
+            # Работаем до SIGTERM/SIGINT (как start_polling), затем - finally ниже
+            stopped = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                # На Windows обработчиков сигналов в asyncio нет
+                with suppress(NotImplementedError):
+                    loop.add_signal_handler(sig, stopped.set)
+            await stopped.wait()
+            logger.info("🛑 Stop signal received, shutting down")
+        else:
+            logger.info("🔄 Starting bot...")
+            # Polling does not work while a webhook is set
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                allowed_updates=dp.resolve_used_update_types()
+            )
     finally:
+        # В режиме webhook здесь же вызывается shutdown диспетчера
+        await api_runner.cleanup()
+        await services.shutdown()
+        sheets_service.close()
+        if archive is not None:
+            archive.close()
         await bot.session.close()
 
 
 if __name__ == "__main__":
+    # Logging configuration (here, so that importing BotServices has no side effects)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('bot.log', encoding='utf-8')
+        ]
+    )
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,258 @@
+"""
+Process metrics in the Prometheus text format, and optional trace spans
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base of the metric types. The API follows prometheus_client
+    (`metric.labels(...).inc()`), so it can be swapped for it later.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._function: Optional[Callable[[], float]] = None
+        _registry.append(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from `function` at scrape time (unlabelled metrics)"""
+        self._function = function
+
+    def _samples(self) -> Iterator[str]:
+        if self._function is not None:
+            try:
+                yield f"{self.name} {float(self._function())}"
+            except Exception as e:
+                logger.warning(f"⚠️ Metric {self.name} callback failed: {e!r}")
+            return
+        for key, child in list(self._children.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {child.value}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _Value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = _Value
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self, span: Optional[str] = None) -> Iterator[None]:
+        """Observe the duration of the block (and record it as a trace span)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed)
+            if span is not None:
+                add_span(span, elapsed)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self, span: Optional[str] = None):
+        return self.labels().time(span)
+
+    def _samples(self) -> Iterator[str]:
+        for key, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _labels(self.labelnames, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {child.sum}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {child.count}"
+
+
+def timed(histogram: Histogram, *labels: str) -> Callable:
+    """Decorator: observe the duration of every call of a coroutine function"""
+    def decorator(func: Callable) -> Callable:
+        child = histogram.labels(*labels)
+        span = ".".join((histogram.name, *labels))
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with child.time(span):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """All registered metrics, Prometheus text exposition format 0.0.4"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# --- trace spans ---
+#
+# Включаются TRACE_UPDATES=1: на каждый апдейт пишется одна строка лога
+# с длительностью обработки и вложенных операций (запросы к Sheets и т.п.).
+
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "trace", default=None
+)
+
+
+@contextmanager
+def trace(name: str) -> Iterator[None]:
+    """Collect spans of everything awaited inside the block, log them at the end"""
+    spans: List[Tuple[str, float]] = []
+    token = _trace.set(spans)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _trace.reset(token)
+        details = ", ".join(f"{span} {duration * 1000:.1f}ms" for span, duration in spans)
+        logger.info(f"🧭 {name} {elapsed * 1000:.1f}ms" + (f" [{details}]" if details else ""))
+
+
+def add_span(name: str, duration: float) -> None:
+    spans = _trace.get()
+    if spans is not None:
+        spans.append((name, duration))
+
+
+# --- metrics of the bot ---
+
+UPDATE_SECONDS = Histogram(
+    "bot_update_seconds", "Time to process an update, by update type", ("type",)
+)
+UPDATE_ERRORS = Counter(
+    "bot_update_errors_total", "Updates whose processing raised, by update type", ("type",)
+)
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Time spent in a handler", ("handler",)
+)
+SHEETS_SECONDS = Histogram(
+    "sheets_request_seconds", "Google Sheets API request latency", ("op",)
+)
+SHEETS_ERRORS = Counter(
+    "sheets_request_errors_total", "Failed Google Sheets API requests", ("op",)
+)
+REMINDER_CYCLE_SECONDS = Histogram(
+    "reminder_cycle_seconds", "Duration of reminder reconcile and catch-up passes",
+    ("phase",), buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0)
+)
+REMINDERS = Counter(
+    "reminders_total", "Reminders handled, by outcome", ("result",)
+)
+REMINDERS_SCHEDULED = Gauge("reminders_scheduled", "Reminders waiting in the timer heap")
+ADMIN_NOTIFICATIONS = Counter(
+    "admin_notifications_total", "Booking alerts sent to the admin chat, single or digest", ("kind",)
+)
+PAGE_CACHE = Counter(
+    "my_bookings_cache_total", "My bookings page cache lookups and invalidations", ("result",)
+)
+STARTUP_SECONDS = Gauge(
+    "startup_seconds", "Seconds from process start to each cold start milestone", ("milestone",)
+)
+BOT_READY = Gauge("bot_ready", "1 once the bot receives updates and has a local copy of the sheet")
+DELIVERY_QUEUE = Gauge("delivery_queue_depth", "Messages waiting for the delivery workers")
+OUTBOX_PENDING = Gauge("bookings_outbox_pending", "Bookings journaled but not yet in the sheet")
+SHEETS_WAITING = Gauge("sheets_quota_waiting", "Requests waiting for a Sheets quota token")
+VISIT_PARSE_FAILURES = Counter(
+    "visit_parse_failures_total", "Visit dates that could not be parsed"
+)
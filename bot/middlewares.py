@@ -0,0 +1,90 @@
+"""
+Dispatcher middlewares
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bot import metrics
+from bot.startup import StartupTracker
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: at most `workers` updates are processed at once.
+    In webhook mode every update is handled in its own background task,
+    this keeps a burst from starting hundreds of handlers simultaneously.
+    """
+
+    def __init__(self, workers: int):
+        self._semaphore = asyncio.Semaphore(workers)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with self._semaphore:
+            return await handler(event, data)
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Outer update middleware: time of every update by its type, errors,
+    and (with trace=True) one log line of trace spans per update.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_type = getattr(event, "event_type", type(event).__name__)
+        try:
+            with metrics.UPDATE_SECONDS.labels(update_type).time():
+                if not self.trace:
+                    return await handler(event, data)
+                with metrics.trace(f"update {getattr(event, 'update_id', '?')} {update_type}"):
+                    return await handler(event, data)
+        except Exception:
+            metrics.UPDATE_ERRORS.labels(update_type).inc()
+            raise
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware: time spent in each handler, labelled by its name"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        with metrics.HANDLER_SECONDS.labels(name).time(f"handler.{name}"):
+            return await handler(event, data)
+
+
+class FirstReplyMiddleware(BaseMiddleware):
+    """Outer update middleware: marks the first handled update of the process"""
+
+    def __init__(self, tracker: StartupTracker):
+        self.tracker = tracker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        result = await handler(event, data)
+        self.tracker.mark("first_reply")
+        return result
@@ -1,114 +1,286 @@
 import asyncio
+import heapq
+import itertools
 import logging
-from datetime import datetime, timedelta
-from aiogram import Bot
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from bot import metrics
+from bot.services.delivery import DeliveryService
 from bot.services.google_sheets import GoogleSheetsService
+from bot.services.reminder_ledger import ReminderLedger, SENT, FAILED, SKIPPED
+from bot.services.visit_time import record_visit_datetime
 from bot.config import config
 
 logger = logging.getLogger(__name__)
 
+# (вид напоминания, за сколько до визита, текст "когда")
+REMINDER_KINDS = (
+    ("24h", timedelta(hours=24), "завтра"),
+    ("2h", timedelta(hours=2), "через 2 години"),
+)
+
+
+def booking_key(booking: Dict) -> str:
+    """Stable identity of a booking: its ID, or user + time for rows without one"""
+    booking_id = str(booking.get('ID') or "")
+    if booking_id:
+        return booking_id
+    return f"{booking.get('User ID')}|{booking.get('Visit Date/Time')}"
+
+
+class Reminder:
+    """Heap entry; cancelled entries stay in the heap and are skipped on pop"""
+    __slots__ = (
+        "due", "seq", "key", "kind", "visit_ts",
+        "user_id", "service", "time_str", "when_text", "cancelled"
+    )
+
+    def __init__(self, due, seq, key, kind, visit_ts, user_id, service, time_str, when_text):
+        self.due = due
+        self.seq = seq
+        self.key = key
+        self.kind = kind
+        self.visit_ts = visit_ts
+        self.user_id = user_id
+        self.service = service
+        self.time_str = time_str
+        self.when_text = when_text
+        self.cancelled = False
+
+    def __lt__(self, other: "Reminder") -> bool:
+        return (self.due, self.seq) < (other.due, other.seq)
+
+
 class ReminderSystem:
-    def __init__(self, bot: Bot, sheets_service: GoogleSheetsService):
-        self.bot = bot
+    """
+    Timer-driven reminders.
+
+    Pending reminders live in a min-heap ordered by due time and the loop
+    sleeps exactly until the earliest one. New bookings are scheduled as
+    they are created (listener on GoogleSheetsService); a periodic
+    reconcile against the local mirror picks up admin edits and deletions.
+
+    Every delivery is recorded in a persistent ledger, so a reminder is
+    never sent twice, and on startup the reminders that came due while
+    the bot was down are sent in one catch-up pass.
+
+    Messages go through the shared DeliveryService, so reminders due at the
+    same moment are sent in parallel within Telegram's rate limits.
+    """
+
+    def __init__(
+        self,
+        delivery: DeliveryService,
+        sheets_service: GoogleSheetsService,
+        ledger: ReminderLedger,
+        reconcile_interval: float = 600.0
+    ):
+        self.delivery = delivery
         self.sheets = sheets_service
+        self.ledger = ledger
+        self.reconcile_interval = reconcile_interval
         self.is_running = False
+        self._heap: List[Reminder] = []
+        self._scheduled: Dict[Tuple[str, str], Reminder] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._in_flight: set = set()
+        # Пока не прошел первый reconcile после catch-up: напоминания со сроком
+        # после его среза еще не отправлены и должны встать в очередь
+        self._catch_up_until: Optional[float] = None
+        self.sheets.add_booking_listener(self.schedule_booking)
+
+    @property
+    def pending(self) -> int:
+        """Number of scheduled (not cancelled) reminders"""
+        return len(self._scheduled)
+
+    # --- schedule ---
+
+    def _cancel(self, slot: Tuple[str, str]) -> None:
+        reminder = self._scheduled.pop(slot, None)
+        if reminder is not None:
+            reminder.cancelled = True
+
+    def schedule_booking(self, booking: Dict) -> None:
+        """(Re)schedule the reminders of a booking, O(log n) each"""
+        user_id = booking.get('User ID')
+        date_str = booking.get('Visit Date/Time')
+        if not date_str or not user_id or user_id == 'ADMIN':
+            return
+
+        visit_dt = record_visit_datetime(booking)
+        if visit_dt is None:
+            return
+
+        key = booking_key(booking)
+        visit_ts = visit_dt.timestamp()
+        horizon = self._catch_up_until or time.time()
+        for kind, before, when_text in REMINDER_KINDS:
+            slot = (key, kind)
+            if self.ledger.done(slot, visit_ts):
+                continue
+            due = (visit_dt - before).timestamp()
+            current = self._scheduled.get(slot)
+            if current is not None and current.due == due and current.user_id == user_id:
+                continue
+            self._cancel(slot)
+            if due < horizon:
+                continue
+
+            reminder = Reminder(
+                due, next(self._seq), key, kind, visit_ts,
+                user_id, booking.get('Service'), date_str, when_text
+            )
+            heapq.heappush(self._heap, reminder)
+            self._scheduled[slot] = reminder
+            # Разбудить цикл, если это напоминание раньше текущего сна
+            if self._heap[0] is reminder:
+                self._wakeup.set()
+
+    def cancel_booking(self, key: str) -> None:
+        """Drop all reminders of a booking"""
+        for kind, _, _ in REMINDER_KINDS:
+            self._cancel((key, kind))
+
+    @metrics.timed(metrics.REMINDER_CYCLE_SECONDS, "reconcile")
+    async def reconcile(self) -> None:
+        """Sync the schedule with upcoming bookings from the local mirror"""
+        bookings = await self.sheets.get_upcoming_bookings()
+        seen = set()
+        for booking in bookings:
+            self.schedule_booking(booking)
+            seen.add(booking_key(booking))
+        self._catch_up_until = None
+
+        # Записи, удаленные или перенесенные в прошлое через админку
+        for key, kind in list(self._scheduled):
+            if key not in seen:
+                self._cancel((key, kind))
+
+        self.ledger.prune(time.time() - 2 * 24 * 3600)
+        self.ledger.heartbeat()
+
+        # Compact the heap if cancelled entries pile up
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [r for r in self._heap if not r.cancelled]
+            heapq.heapify(self._heap)
+
+    @metrics.timed(metrics.REMINDER_CYCLE_SECONDS, "catch_up")
+    async def catch_up(self) -> None:
+        """
+        Send reminders that came due while the bot was down.
+        Only the latest overdue reminder of a booking is sent, the earlier
+        ones are marked as skipped (no "tomorrow" two hours before a visit).
+        """
+        last_alive = self.ledger.last_alive
+        if last_alive is None:
+            # Первый запуск: не знаем, что уже отправлялось раньше
+            self.ledger.heartbeat()
+            return
+
+        now = time.time()
+        self._catch_up_until = now
+        missed: List[Reminder] = []
+        for booking in await self.sheets.get_upcoming_bookings():
+            user_id = booking.get('User ID')
+            date_str = booking.get('Visit Date/Time')
+            visit_dt = record_visit_datetime(booking)
+            if visit_dt is None or not user_id or user_id == 'ADMIN':
+                continue
+
+            key = booking_key(booking)
+            visit_ts = visit_dt.timestamp()
+            overdue = []
+            for kind, before, when_text in REMINDER_KINDS:
+                due = (visit_dt - before).timestamp()
+                if last_alive <= due < now and not self.ledger.done((key, kind), visit_ts):
+                    overdue.append(Reminder(
+                        due, next(self._seq), key, kind, visit_ts,
+                        user_id, booking.get('Service'), date_str, when_text
+                    ))
+            if not overdue:
+                continue
+
+            overdue.sort()
+            for reminder in overdue[:-1]:
+                self.ledger.mark((key, reminder.kind), SKIPPED, reminder.visit_ts)
+                metrics.REMINDERS.labels(SKIPPED).inc()
+            missed.append(overdue[-1])
+
+        if missed:
+            logger.info(f"🔔 Catching up {len(missed)} reminders missed during downtime")
+            await asyncio.gather(*(self._deliver(reminder) for reminder in missed))
+        self.ledger.heartbeat()
+
+    async def _deliver(self, reminder: Reminder) -> None:
+        slot = (reminder.key, reminder.kind)
+        if self.ledger.done(slot, reminder.visit_ts):
+            return
+        sent = await self.send_reminder(
+            reminder.user_id, reminder.service,
+            reminder.time_str, reminder.when_text
+        )
+        self.ledger.mark(slot, SENT if sent else FAILED, reminder.visit_ts)
+        metrics.REMINDERS.labels(SENT if sent else FAILED).inc()
+
+    # --- loops ---
 
     async def start(self):
         self.is_running = True
         logger.info("🔔 Reminder system started")
+        try:
+            await self.catch_up()
+        except Exception as e:
+            logger.error(f"❌ Error sending missed reminders: {e!r}")
+        await asyncio.gather(self._reconcile_loop(), self._dispatch_loop())
+
+    def stop(self) -> None:
+        self.is_running = False
+        self._wakeup.set()
+
+    async def _reconcile_loop(self) -> None:
         while self.is_running:
             try:
-                await self.check_bookings()
+                await self.reconcile()
             except Exception as e:
-                logger.error(f"❌ Error in reminder loop: {e}")
-            
-            # Проверяем раз в 5 минут (300 сек), чтобы не спамить запросами
-            await asyncio.sleep(300) 
-
-    async def check_bookings(self):
-        bookings = self.sheets.get_all_bookings()
-        now = datetime.now()
-        
-        # Словарь месяцев для парсинга английских дат (если в таблице они на английском)
-        # Если в таблице уже украинские даты, нужно будет адаптировать парсер
-        # Пока предполагаем, что в таблице сохраняется формат из script.js (который мы перевели на укр)
-        # Формат: "Пт, 16 січня 2026, 15:00"
-        
-        months_ua = {
-            'січня': 1, 'лютого': 2, 'березня': 3, 'квітня': 4, 'травня': 5, 'червня': 6,
-            'липня': 7, 'серпня': 8, 'вересня': 9, 'жовтня': 10, 'листопада': 11, 'грудня': 12
-        }
+                logger.error(f"❌ Error reconciling reminders: {e!r}")
+            await asyncio.sleep(self.reconcile_interval)
 
-        for booking in bookings:
-            # Формат в таблице: "Пт, 16 січня 2026, 15:00"
-            date_str = booking.get('Visit Date/Time')
-            user_id = booking.get('User ID')
-            service = booking.get('Service')
-            
-            if not date_str or not user_id or user_id == 'ADMIN':
+    async def _dispatch_loop(self) -> None:
+        while self.is_running:
+            # Drop cancelled heads
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+
+            now = time.time()
+            if self._heap and self._heap[0].due <= now:
+                reminder = heapq.heappop(self._heap)
+                self._scheduled.pop((reminder.key, reminder.kind), None)
+                if reminder.visit_ts > now:
+                    # Не ждем доставки: пул отправки сам соблюдает лимиты Telegram
+                    task = asyncio.create_task(self._deliver(reminder))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._in_flight.discard)
                 continue
 
+            # Спим ровно до ближайшего напоминания (или до нового раньше него)
+            timeout = self._heap[0].due - now if self._heap else None
+            self._wakeup.clear()
             try:
-                # Парсим дату
-                # 1. Убираем день недели "Пт, " -> "16 січня 2026, 15:00"
-                # Но может быть и без дня недели, если старые записи.
-                # Попробуем универсально.
-                
-                clean_str = date_str
-                if ',' in date_str:
-                    parts_comma = date_str.split(', ')
-                    if len(parts_comma) > 2: # "Пт, 16 січня 2026, 15:00" -> ["Пт", "16 січня 2026", "15:00"]
-                         # Это если формат "Day, Date, Time"
-                         # В script.js мы делали: `${weekdays[date.getDay()]}, ${day} ${months[date.getMonth()]} ${date.getFullYear()}, ${timeValue}`
-                         # То есть: "Пт, 16 січня 2026, 15:00"
-                         # split(', ') даст: ["Пт", "16 січня 2026", "15:00"]
-                         date_part = parts_comma[1] # "16 січня 2026"
-                         time_part = parts_comma[2] # "15:00"
-                    elif len(parts_comma) == 2:
-                        # Может быть "Date, Time"
-                        date_part = parts_comma[0]
-                        time_part = parts_comma[1]
-                    else:
-                        continue
-                else:
-                    continue
-
-                # date_part: "16 січня 2026"
-                d_parts = date_part.split() # ["16", "січня", "2026"]
-                
-                day = int(d_parts[0])
-                month = months_ua.get(d_parts[1].lower())
-                year = int(d_parts[2])
-                
-                hour = int(time_part.split(':')[0])
-                minute = int(time_part.split(':')[1])
-                
-                booking_dt = datetime(year, month, day, hour, minute)
-                
-                # --- ЛОГИКА НАПОМИНАНИЯ ---
-                time_diff = booking_dt - now
-                
-                # Напоминание за 24 часа
-                if timedelta(hours=23, minutes=55) < time_diff < timedelta(hours=24, minutes=5):
-                    await self.send_reminder(user_id, service, date_str, "завтра")
-                
-                # Напоминание за 2 часа
-                if timedelta(hours=1, minutes=55) < time_diff < timedelta(hours=2, minutes=5):
-                    await self.send_reminder(user_id, service, date_str, "через 2 години")
-                    
-            except Exception as e:
-                # logger.error(f"Date parse error for {date_str}: {e}")
-                continue
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-    async def send_reminder(self, user_id, service, time_str, when_text):
-        try:
-            text = (
-                f"🔔 <b>Нагадування про запис!</b>\n\n"
-                f"Ви записані на <b>{service}</b> вже {when_text}.\n"
-                f"🕒 Час: {time_str}\n\n"
-                f"Чекаємо на вас!"
-            )
-            await self.bot.send_message(chat_id=user_id, text=text)
+    async def send_reminder(self, user_id, service, time_str, when_text) -> bool:
+        text = (
+            f"🔔 <b>Нагадування про запис!</b>\n\n"
+            f"Ви записані на <b>{service}</b> вже {when_text}.\n"
+            f"🕒 Час: {time_str}\n\n"
+            f"Чекаємо на вас!"
+        )
+        sent = await self.delivery.send(user_id, text)
+        if sent:
             logger.info(f"✅ Reminder sent to {user_id}")
-        except Exception as e:
-            logger.warning(f"Failed to send reminder to {user_id}: {e}")
\ No newline at end of file
+        return sent
@@ -0,0 +1,127 @@
+"""
+Running booking counts for the admin panel
+"""
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bot.services.google_sheets import GoogleSheetsService
+from bot.services.visit_time import record_visit_datetime
+
+logger = logging.getLogger(__name__)
+
+# (day, hour, service) of one booking; day and hour are None if the visit time is unknown
+Bucket = Tuple[Optional[date], Optional[int], str]
+
+
+def _bucket(visit: Optional[datetime], service: str) -> Bucket:
+    if visit is None:
+        return None, None, service
+    return visit.date(), visit.hour, service
+
+
+class BookingAggregates:
+    """
+    Bookings per day, per service, per hour and per (day, hour).
+
+    Kept like the availability bitmaps: a new booking is counted through
+    the booking listener in O(1); when a sheet sync changes the mirror the
+    local index is diffed against what was counted, and only the changed
+    bookings are added or subtracted. Queries are answered from the local
+    mirror (kept fresh by the background sync or POST /api/admin/refresh)
+    and never read the sheet.
+    """
+
+    def __init__(self, sheets: GoogleSheetsService):
+        self.sheets = sheets
+        self.by_day: Counter = Counter()
+        self.by_service: Counter = Counter()
+        self.by_hour: Counter = Counter()
+        self.by_day_hour: Counter = Counter()
+        # Что уже посчитано: ключ брони -> корзина (для вычитания при изменениях)
+        self._counted: Dict[str, Bucket] = {}
+        self._built_version: Optional[int] = None
+        sheets.add_booking_listener(self._on_booking_added)
+
+    def _add(self, key: str, bucket: Bucket) -> None:
+        self._counted[key] = bucket
+        day, hour, service = bucket
+        self.by_service[service] += 1
+        if day is not None:
+            self.by_day[day] += 1
+            self.by_hour[hour] += 1
+            self.by_day_hour[day, hour] += 1
+
+    @staticmethod
+    def _decrement(counter: Counter, key) -> None:
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def _remove(self, key: str) -> None:
+        day, hour, service = self._counted.pop(key)
+        self._decrement(self.by_service, service)
+        if day is not None:
+            self._decrement(self.by_day, day)
+            self._decrement(self.by_hour, hour)
+            self._decrement(self.by_day_hour, (day, hour))
+
+    def _on_booking_added(self, booking: Dict) -> None:
+        if self._built_version is not None:
+            # Тот же ключ, что у строки журнала в index_entries()
+            key = f"o{booking.get('ID')}"
+            if key not in self._counted:
+                self._add(key, _bucket(record_visit_datetime(booking), str(booking.get("Service") or "")))
+
+    async def _ensure_current(self) -> None:
+        await self.sheets.ensure_mirror()
+        store = self.sheets.store
+        if self._built_version == store.sync_version:
+            return
+        entries = store.index_entries()
+        version = store.sync_version
+        current = {
+            key: _bucket(datetime.fromtimestamp(visit_ts) if visit_ts is not None else None, service or "")
+            for key, visit_ts, service in entries
+        }
+        changed = 0
+        for key in [key for key, bucket in self._counted.items() if current.get(key) != bucket]:
+            self._remove(key)
+            changed += 1
+        for key, bucket in current.items():
+            if key not in self._counted:
+                self._add(key, bucket)
+                changed += 1
+        self._built_version = version
+        logger.info(f"📊 Aggregates updated: {changed} changes, {len(self._counted)} bookings")
+
+    async def total(self) -> int:
+        await self._ensure_current()
+        return len(self._counted)
+
+    async def summary(self, start: date, days: int) -> Dict:
+        """
+        Counts for `days` days from `start` (with per-hour counts for the
+        heatmap), plus per-service and per-hour totals over all bookings
+        """
+        await self._ensure_current()
+        dates = [start + timedelta(days=offset) for offset in range(days)]
+        hours = sorted(self.by_hour)
+        return {
+            "from": start.isoformat(),
+            "total": len(self._counted),
+            "days": {day.isoformat(): self.by_day.get(day, 0) for day in dates},
+            "hours": {str(hour): count for hour, count in sorted(self.by_hour.items())},
+            "services": dict(self.by_service.most_common()),
+            "heatmap": {
+                "hours": hours,
+                "rows": [[self.by_day_hour.get((day, hour), 0) for hour in hours] for day in dates],
+            },
+        }
+
+    async def day(self, day: date) -> List[Tuple[Optional[int], Dict]]:
+        """Bookings of one day by time, as (worksheet row, record)"""
+        await self.sheets.ensure_mirror()
+        start = datetime.combine(day, datetime.min.time())
+        return self.sheets.store.between(start.timestamp(), (start + timedelta(days=1)).timestamp())
@@ -0,0 +1,198 @@
+"""
+Monthly archive partitions of past bookings
+"""
+import csv
+import gzip
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bot.services.visit_time import visit_datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_partitions (
+    month    TEXT PRIMARY KEY,  -- YYYY-MM of the visit
+    path     TEXT,
+    rows     INTEGER,
+    updated  REAL,
+    indexed  INTEGER DEFAULT 0  -- users of the partition are in archive_users
+);
+CREATE TABLE IF NOT EXISTS archive_users (
+    user_id  TEXT,
+    month    TEXT,
+    PRIMARY KEY (user_id, month)
+) WITHOUT ROWID;
+"""
+
+
+def visit_month(visit: str, visit_iso: str = "") -> Optional[str]:
+    """Partition of a booking: the month of the visit, None if unknown"""
+    visit_dt = visit_datetime(visit, visit_iso)
+    return f"{visit_dt:%Y-%m}" if visit_dt else None
+
+
+def month_key(day: date) -> str:
+    return f"{day:%Y-%m}"
+
+
+class BookingArchive:
+    """
+    Past bookings moved out of the live worksheet, one gzip-compressed CSV
+    per visit month (bookings-YYYY-MM.csv.gz), plus a catalog of the
+    partitions in SQLite.
+
+    Files are only appended to (gzip members), a partition written twice
+    after an interrupted archive pass is deduplicated by booking ID on read.
+    The catalog also records which users have bookings in which months, so
+    a user's history reads only those partitions.
+    """
+
+    def __init__(self, directory: str, db_path: str, headers: List[str]):
+        self.directory = directory
+        self.headers = headers
+        self._user_column = headers.index("User ID")
+        os.makedirs(directory, exist_ok=True)
+        # Файлы пишутся и читаются в потоках (asyncio.to_thread): одно
+        # соединение на всех, поэтому и оно, и файлы - под блокировкой
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+
+    def _migrate(self) -> None:
+        """Add columns introduced after the catalog was created"""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(archive_partitions)")}
+        if "indexed" not in existing:
+            self._conn.execute("ALTER TABLE archive_partitions ADD COLUMN indexed INTEGER DEFAULT 0")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _path(self, month: str) -> str:
+        return os.path.join(self.directory, f"bookings-{month}.csv.gz")
+
+    def write(self, month: str, rows: List[list]) -> None:
+        """Durably append rows to a partition and record it in the catalog"""
+        path = self._path(month)
+        users = {(str(row[self._user_column]), month) for row in rows if len(row) > self._user_column}
+        with self._lock:
+            new_file = not os.path.exists(path)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if new_file:
+                writer.writerow(self.headers)
+            writer.writerows([str(value) for value in row] for row in rows)
+            with open(path, "ab") as f:
+                f.write(gzip.compress(buffer.getvalue().encode("utf-8")))
+                f.flush()
+                os.fsync(f.fileno())
+            with self._conn:
+                # Новый раздел сразу проиндексирован; у старого без индекса
+                # пользователи соберутся при первом чтении (_index_partitions)
+                self._conn.execute(
+                    "INSERT INTO archive_partitions (month, path, rows, updated, indexed) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (month) DO UPDATE SET rows = rows + excluded.rows, "
+                    "updated = excluded.updated",
+                    (month, path, len(rows), time.time(), int(new_file))
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO archive_users VALUES (?, ?)", users)
+        logger.info(f"🗃 Archived {len(rows)} bookings into {month}")
+
+    def partitions(self) -> List[Tuple[str, int]]:
+        """Catalog: (month, rows) from the newest partition to the oldest"""
+        with self._lock:
+            return list(self._conn.execute(
+                "SELECT month, rows FROM archive_partitions ORDER BY month DESC"
+            ))
+
+    def _read_file(self, path: str) -> List[Dict]:
+        if not os.path.exists(path):
+            return []
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            records: Dict[str, Dict] = {}
+            for position, values in enumerate(reader):
+                record = dict(zip(self.headers, values))
+                # Повторная запись той же брони после прерванного прохода
+                records[record.get("ID") or f"#{position}"] = record
+        return list(records.values())
+
+    def read(self, month: str) -> List[Dict]:
+        """All bookings of a partition, as records keyed by the headers"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM archive_partitions WHERE month = ?", (month,)
+            ).fetchone()
+            return self._read_file(row[0]) if row is not None else []
+
+    def _index_partitions(self) -> None:
+        """Fill archive_users for partitions written before it existed (once each)"""
+        pending = list(self._conn.execute(
+            "SELECT month, path FROM archive_partitions WHERE NOT indexed"
+        ))
+        for month, path in pending:
+            users = {(record.get("User ID") or "", month) for record in self._read_file(path)}
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO archive_users VALUES (?, ?)", users)
+                self._conn.execute("UPDATE archive_partitions SET indexed = 1 WHERE month = ?", (month,))
+            logger.info(f"🗃 Indexed users of archive partition {month}")
+
+    def user_months(self, user_id) -> List[str]:
+        """Months with archived bookings of the user, oldest first (catalog only)"""
+        with self._lock:
+            self._index_partitions()
+            return [month for (month,) in self._conn.execute(
+                "SELECT month FROM archive_users WHERE user_id = ? ORDER BY month", (str(user_id),)
+            )]
+
+    def by_user(self, user_id, months: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        A user's archived bookings, oldest partition first. Only the
+        partitions the catalog lists for the user are read (and of those,
+        only `months` if given).
+        """
+        user_id = str(user_id)
+        candidates = self.user_months(user_id)
+        if months is not None:
+            wanted = set(months)
+            candidates = [month for month in candidates if month in wanted]
+        return [
+            record
+            for month in candidates
+            for record in self.read(month)
+            if record.get("User ID") == user_id
+        ]
+
+    @staticmethod
+    def split(
+        columns: Dict[str, Tuple[str, ...]],
+        before: date,
+        first_row: int = 2
+    ) -> Dict[str, List[Tuple[int, str]]]:
+        """
+        Pick the rows to archive from a columnar read of ID, Visit Date/Time
+        and Visit ISO: visits in months before `before`, grouped by month,
+        as (row number, booking ID)
+        """
+        cutoff = month_key(before)
+        result: Dict[str, List[Tuple[int, str]]] = {}
+        rows = zip(columns["ID"], columns["Visit Date/Time"], columns["Visit ISO"])
+        for number, (booking_id, visit, visit_iso) in enumerate(rows, start=first_row):
+            if not booking_id and not visit:
+                continue
+            month = visit_month(visit, visit_iso)
+            if month is not None and month < cutoff:
+                result.setdefault(month, []).append((number, booking_id))
+        return result
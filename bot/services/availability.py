@@ -0,0 +1,255 @@
+"""
+Slot availability computed from the local bookings mirror
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from bot.services.google_sheets import GoogleSheetsService
+from bot.services.visit_time import record_visit_datetime
+
+logger = logging.getLogger(__name__)
+
+# Сетка слотов, как в webapp/script.js (generateTimeSlots)
+OPEN_HOUR = 9
+CLOSE_HOUR = 20
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = (CLOSE_HOUR - OPEN_HOUR) * 60 // SLOT_MINUTES
+FULL_DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+# Длительность услуг в минутах (data-duration из webapp/index.html)
+SERVICE_DURATIONS = {
+    "Чоловіча стрижка": 45,
+    "Жіноча стрижка": 60,
+    "Дитяча стрижка": 30,
+    "Фарбування коренів": 90,
+    "Повне фарбування": 120,
+    "Мелірування": 150,
+    "Маска для волосся": 30,
+    "Кератинове випрямлення": 180,
+    "Кератинове вирівнювання": 180,  # название из admin.html
+    "Ботокс для волосся": 120,
+}
+DEFAULT_DURATION = 60
+
+
+# Число полос блокировок для резервирования (по дате)
+LOCK_STRIPES = 16
+
+
+class SlotUnavailableError(Exception):
+    """The requested time is taken, in the past or outside working hours"""
+
+
+def service_duration(service: str) -> int:
+    return SERVICE_DURATIONS.get(service, DEFAULT_DURATION)
+
+
+def blocks_needed(duration: int) -> int:
+    return max(1, math.ceil(duration / SLOT_MINUTES))
+
+
+def slot_index(value: datetime) -> Optional[int]:
+    """Slot number of a time within the working day, None if outside the grid"""
+    minutes = (value.hour - OPEN_HOUR) * 60 + value.minute
+    if minutes < 0 or minutes % SLOT_MINUTES:
+        return None
+    index = minutes // SLOT_MINUTES
+    return index if index < SLOTS_PER_DAY else None
+
+
+def slot_time(index: int) -> str:
+    minutes = OPEN_HOUR * 60 + index * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def block_mask(start: int, blocks: int) -> int:
+    """Bits start..start+blocks-1, clipped to the working day"""
+    return ((1 << blocks) - 1) << start & FULL_DAY_MASK
+
+
+def free_starts(busy: int, duration: int) -> int:
+    """
+    Bitmap of start slots where a service of `duration` minutes fits:
+    every block it needs is free and it ends before closing.
+    """
+    blocks = blocks_needed(duration)
+    if blocks > SLOTS_PER_DAY:
+        return 0
+    free = ~busy & FULL_DAY_MASK
+    fits = free
+    for shift in range(1, blocks):
+        fits &= free >> shift
+    return fits & ((1 << (SLOTS_PER_DAY - blocks + 1)) - 1)
+
+
+class AvailabilityService:
+    """
+    Per-day occupancy bitmaps (bit i = slot OPEN_HOUR + i * SLOT_MINUTES).
+
+    New bookings are added incrementally through the booking listener,
+    in O(blocks). When a sheet sync changes the mirror (admin edits,
+    deletions), the bitmaps are rebuilt from upcoming bookings on the
+    next query.
+
+    Every day carries a version, bumped whenever its bitmap changes; it is
+    exposed as an ETag so clients can revalidate cached days cheaply.
+
+    reserve() is the server-side guard against double booking: under a
+    per-date lock stripe it checks the service's blocks against the bitmap
+    and holds them until the booking is written.
+    """
+
+    def __init__(self, sheets: GoogleSheetsService):
+        self.sheets = sheets
+        self._days: Dict[date, int] = {}
+        self._built_version: Optional[int] = None
+        self._built_day: Optional[date] = None
+        self._versions: Dict[date, int] = {}
+        # Slots held by bookings that are being written right now
+        self._reserved: Dict[date, int] = {}
+        self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+        # ETags must not repeat after a restart (versions start from zero again)
+        self._epoch = format(int(time.time()), "x")
+        sheets.add_booking_listener(self._on_booking_added)
+
+    def _occupy(self, booking: Dict) -> Optional[date]:
+        """Mark the slots of a booking as busy, returns the affected day"""
+        visit_dt = record_visit_datetime(booking)
+        if visit_dt is None:
+            return None
+        start = slot_index(visit_dt)
+        if start is None:
+            return None
+        blocks = blocks_needed(service_duration(str(booking.get("Service") or "")))
+        day = visit_dt.date()
+        self._days[day] = self._days.get(day, 0) | block_mask(start, blocks)
+        return day
+
+    def _bump(self, day: date) -> None:
+        self._versions[day] = self._versions.get(day, 0) + 1
+
+    def _on_booking_added(self, booking: Dict) -> None:
+        if self._built_version is not None:
+            day = self._occupy(booking)
+            if day is not None:
+                # Invalidate cached copies of this day only
+                self._bump(day)
+
+    async def _ensure_built(self) -> None:
+        """Rebuild from the local mirror; only the very first start downloads the sheet"""
+        await self.sheets.ensure_mirror()
+        store = self.sheets.store
+        today = date.today()
+        if self._built_version == store.sync_version and self._built_day == today:
+            return
+        version = store.sync_version
+        midnight = datetime.combine(today, datetime.min.time()).timestamp()
+        bookings = store.upcoming(midnight)
+        previous, self._days = self._days, {}
+        for booking in bookings:
+            self._occupy(booking)
+        for day in previous.keys() | self._days.keys():
+            if previous.get(day) != self._days.get(day):
+                self._bump(day)
+        self._built_version = version
+        self._built_day = today
+        logger.info(f"📅 Availability rebuilt: {len(bookings)} bookings, {len(self._days)} days")
+
+    async def busy_mask(self, day: date) -> int:
+        await self._ensure_built()
+        return self._days.get(day, 0) | self._reserved.get(day, 0)
+
+    def etag(self, day: date) -> str:
+        return f'"{self._epoch}-{day:%Y%m%d}-{self._versions.get(day, 0)}"'
+
+    async def fits(self, visit_dt: datetime, duration: int) -> bool:
+        """Can a service of `duration` minutes start at visit_dt?"""
+        start = slot_index(visit_dt)
+        if start is None:
+            return False
+        return bool(free_starts(await self.busy_mask(visit_dt.date()), duration) >> start & 1)
+
+    @asynccontextmanager
+    async def reserve(self, visit_dt: datetime, duration: int) -> AsyncIterator[None]:
+        """
+        Hold the slots of a new booking while it is being written.
+
+            async with availability.reserve(visit_dt, duration):
+                await sheets.add_booking(...)
+
+        Raises SlotUnavailableError if any of the needed blocks is busy.
+        The check is O(blocks) against the in-memory bitmap, no sheet reads.
+        """
+        start = slot_index(visit_dt)
+        blocks = blocks_needed(duration)
+        if start is None or start + blocks > SLOTS_PER_DAY:
+            raise SlotUnavailableError("outside working hours")
+        if visit_dt <= datetime.now():
+            raise SlotUnavailableError("time has passed")
+
+        day = visit_dt.date()
+        mask = block_mask(start, blocks)
+        # Возможная загрузка таблицы - до блокировки, под ней только битмапы
+        await self._ensure_built()
+        async with self._locks[day.toordinal() % LOCK_STRIPES]:
+            if await self.busy_mask(day) & mask:
+                raise SlotUnavailableError("slot is taken")
+            self._reserved[day] = self._reserved.get(day, 0) | mask
+            self._bump(day)
+        try:
+            yield
+        finally:
+            # Записанная бронь уже в битовой карте (listener), снимаем удержание
+            self._reserved[day] &= ~mask
+            if not self._reserved[day]:
+                del self._reserved[day]
+            self._bump(day)
+
+    async def day(self, day: date, duration: Optional[int] = None) -> Dict:
+        """JSON-ready description of a day for the web app"""
+        busy = await self.busy_mask(day)
+        result = {
+            "date": day.isoformat(),
+            "open": slot_time(0),
+            "slot_minutes": SLOT_MINUTES,
+            "slots": SLOTS_PER_DAY,
+            "busy_mask": busy,
+            "busy_slots": [
+                {"time": slot_time(i)} for i in range(SLOTS_PER_DAY) if busy >> i & 1
+            ],
+            "etag": self.etag(day),
+        }
+        if duration:
+            free = free_starts(busy, duration)
+            result["free_slots"] = [slot_time(i) for i in range(SLOTS_PER_DAY) if free >> i & 1]
+        return result
+
+    async def days_range(self, start: date, days: int) -> Dict:
+        """
+        Compact availability of `days` days from `start`: one busy bitmask
+        and ETag per day, plus an ETag of the whole range.
+        """
+        await self._ensure_built()
+        result: List[Dict] = []
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            result.append({
+                "date": day.isoformat(),
+                "busy_mask": self._days.get(day, 0) | self._reserved.get(day, 0),
+                "etag": self.etag(day),
+            })
+        digest = hashlib.sha1("|".join(item["etag"] for item in result).encode()).hexdigest()
+        return {
+            "from": start.isoformat(),
+            "open": slot_time(0),
+            "slot_minutes": SLOT_MINUTES,
+            "slots": SLOTS_PER_DAY,
+            "days": result,
+            "etag": f'"{digest[:20]}"',
+        }
@@ -0,0 +1,356 @@
+"""
+Local SQLite mirror of the bookings worksheet
+"""
+import sqlite3
+import logging
+from typing import Iterable, List, Dict, Optional, Tuple
+
+from bot.services.visit_time import visit_datetime
+
+logger = logging.getLogger(__name__)
+
+# Колонки таблицы в том же порядке, что и GoogleSheetsService.HEADERS
+COLUMNS = (
+    "booking_id",
+    "booking_date",
+    "name",
+    "phone",
+    "service",
+    "visit",
+    "user_id",
+    "username",
+    "visit_iso",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    row          INTEGER PRIMARY KEY,  -- row number in the worksheet
+    booking_id   TEXT,
+    booking_date TEXT,
+    name         TEXT,
+    phone        TEXT,
+    service      TEXT,
+    visit        TEXT,
+    user_id      TEXT,
+    username     TEXT,
+    visit_iso    TEXT,
+    visit_ts     REAL                  -- visit time as epoch, NULL if unknown
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id, visit_ts);
+CREATE INDEX IF NOT EXISTS idx_bookings_visit ON bookings (visit_ts);
+CREATE INDEX IF NOT EXISTS idx_bookings_id ON bookings (booking_id);
+-- Journal of bookings accepted by the bot but not yet appended to the sheet
+CREATE TABLE IF NOT EXISTS outbox (
+    seq          INTEGER PRIMARY KEY,  -- booking ID
+    booking_id   TEXT,
+    booking_date TEXT,
+    name         TEXT,
+    phone        TEXT,
+    service      TEXT,
+    visit        TEXT,
+    user_id      TEXT,
+    username     TEXT,
+    visit_iso    TEXT,
+    visit_ts     REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_user ON outbox (user_id, visit_ts);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class BookingStore:
+    """
+    Embedded copy of the sheet rows.
+
+    Rows are keyed by their worksheet row number, so a pull of the
+    sheet tail can be applied with a plain upsert. All methods are cheap
+    local calls and are meant to be used from the event loop thread.
+
+    Bookings that are not in the sheet yet wait in the `outbox` journal
+    and are already visible to reads.
+    """
+
+    def __init__(self, path: str, headers: List[str]):
+        self.path = path
+        self.headers = headers
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.commit()
+        # Bumped whenever a sync changes the mirror, lets derived indexes rebuild lazily
+        self.sync_version = 0
+        # Number of bookings (mirror + journal), kept up to date by the writes
+        self._count: Optional[int] = None
+
+    def _migrate(self) -> None:
+        """Add columns introduced after the database was created"""
+        for table in ("bookings", "outbox"):
+            existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if "visit_iso" not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN visit_iso TEXT")
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # --- sync state ---
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _bump_sequence(self, data: List[tuple]) -> None:
+        """Keep the ID counter above every numeric ID seen in the sheet"""
+        ids = [int(row[1]) for row in data if row[1].isdigit()]
+        if ids:
+            self._raise_sequence(max(ids))
+
+    def _raise_sequence(self, value: int) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('booking_seq', ?) "
+            # meta.value - TEXT: без CAST текст всегда "больше" числа
+            "ON CONFLICT (key) DO UPDATE SET "
+            "value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))",
+            (value,)
+        )
+
+    def reserve_booking_ids(self, up_to: int) -> None:
+        """Make next_booking_id() skip every ID up to `up_to` (taken elsewhere)"""
+        with self._conn:
+            self._raise_sequence(up_to)
+
+    def next_booking_id(self) -> int:
+        """
+        Allocate the next booking ID from the persisted counter.
+        A single UPDATE ... RETURNING, so it is atomic even across processes.
+        """
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('booking_seq', 0)"
+            )
+            row = self._conn.execute(
+                "UPDATE meta SET value = CAST(value AS INTEGER) + 1 "
+                "WHERE key = 'booking_seq' RETURNING value"
+            ).fetchone()
+        return int(row["value"])
+
+    @property
+    def last_row(self) -> Optional[int]:
+        """Last worksheet row pulled contiguously, None if never synced"""
+        value = self._get_meta("last_row")
+        return int(value) if value is not None else None
+
+    # --- writes ---
+
+    @staticmethod
+    def _to_db_row(row_number: int, values: list) -> tuple:
+        values = [str(v) if v is not None else "" for v in values[:len(COLUMNS)]]
+        values += [""] * (len(COLUMNS) - len(values))
+        # Display string (parsed once, cached), the ISO column if it does not parse
+        visit_dt = visit_datetime(values[5], values[8])
+        return (row_number, *values, visit_dt.timestamp() if visit_dt else None)
+
+    def _upsert(self, rows: Iterable[tuple]) -> None:
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO bookings (row, {', '.join(COLUMNS)}, visit_ts) "
+            f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+            rows
+        )
+
+    def replace_all(self, values: List[list]) -> None:
+        """Replace the mirror with a full sheet download (header row included)"""
+        data = [
+            self._to_db_row(number, row)
+            for number, row in enumerate(values[1:], start=2)
+            if any(row)
+        ]
+        with self._conn:
+            self._conn.execute("DELETE FROM bookings")
+            self._upsert(data)
+            self._bump_sequence(data)
+            self._set_meta("last_row", max(len(values), 1))
+        self._count = None
+        self.sync_version += 1
+        logger.info(f"🗄 Local mirror rebuilt: {len(data)} bookings")
+
+    def apply_tail(self, first_row: int, values: List[list]) -> int:
+        """Apply rows pulled from first_row onwards, returns number of new rows"""
+        data = [
+            self._to_db_row(number, row)
+            for number, row in enumerate(values, start=first_row)
+            if any(row)
+        ]
+        with self._conn:
+            self._upsert(data)
+            self._bump_sequence(data)
+            if values:
+                self._set_meta("last_row", first_row + len(values) - 1)
+        if data:
+            # Строки могли заменить уже известные, пересчитаем при запросе
+            self._count = None
+            self.sync_version += 1
+        return len(data)
+
+    # --- write journal ---
+
+    def enqueue(self, booking_id: int, values: list) -> None:
+        """Durably journal a new booking before it is sent to the sheet"""
+        with self._conn:
+            self._conn.execute(
+                f"INSERT INTO outbox (seq, {', '.join(COLUMNS)}, visit_ts) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+                self._to_db_row(booking_id, values)
+            )
+        if self._count is not None:
+            self._count += 1
+
+    def pending(self, limit: int) -> List[tuple]:
+        """Oldest journaled bookings as (booking_id, row values)"""
+        rows = self._conn.execute(
+            f"SELECT seq, {', '.join(COLUMNS)} FROM outbox ORDER BY seq LIMIT ?", (limit,)
+        )
+        return [(row["seq"], [row[column] for column in COLUMNS]) for row in rows]
+
+    def pending_count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def mark_flushed(self, first_row: Optional[int], batch: List[tuple]) -> None:
+        """Move a batch appended at first_row from the journal into the mirror"""
+        # Без номера строки бронь вернется в зеркало только со следующей синхронизацией
+        removed = len(batch)
+        with self._conn:
+            if first_row:
+                removed = self._conn.execute(
+                    "SELECT COUNT(*) FROM bookings WHERE row BETWEEN ? AND ?",
+                    (first_row, first_row + len(batch) - 1)
+                ).fetchone()[0]
+                self._upsert([
+                    self._to_db_row(first_row + offset, values)
+                    for offset, (_, values) in enumerate(batch)
+                ])
+                if self.last_row == first_row - 1:
+                    self._set_meta("last_row", first_row + len(batch) - 1)
+            self._conn.executemany(
+                "DELETE FROM outbox WHERE seq = ?", [(seq,) for seq, _ in batch]
+            )
+        if self._count is not None:
+            self._count -= removed
+
+    def drop_flushed(self) -> int:
+        """
+        Forget journal entries that already reached the sheet
+        (appended before a crash or a timed out response).
+        """
+        with self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE booking_id IN (SELECT booking_id FROM bookings)"
+            )
+        if self._count is not None:
+            self._count -= cursor.rowcount
+        return cursor.rowcount
+
+    # --- reads ---
+
+    def _to_record(self, row: sqlite3.Row) -> Dict:
+        return {header: row[column] for header, column in zip(self.headers, COLUMNS)}
+
+    def _select(
+        self,
+        where: str = "",
+        params: tuple = (),
+        order: str = "pos",
+        limit: int = -1,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Mirror rows followed by journaled ones, in sheet order by default"""
+        columns = ', '.join(COLUMNS)
+        where = f"WHERE {where}" if where else ""
+        rows = self._conn.execute(
+            f"SELECT {columns}, visit_ts, row AS pos FROM bookings {where} "
+            f"UNION ALL SELECT {columns}, visit_ts, 1e12 + seq AS pos FROM outbox {where} "
+            f"ORDER BY {order} LIMIT ? OFFSET ?",
+            params * 2 + (limit, offset)
+        )
+        return [self._to_record(row) for row in rows]
+
+    def all(self) -> List[Dict]:
+        return self._select()
+
+    def by_user(self, user_id) -> List[Dict]:
+        return self._select("user_id = ?", (str(user_id),))
+
+    def user_snapshot(self, user_id) -> tuple:
+        """
+        What the user's bookings look like (visit, service), independent of
+        whether they are flushed yet; equal snapshots mean nothing to re-render
+        """
+        rows = self._conn.execute(
+            "SELECT visit_ts, visit, service FROM bookings WHERE user_id = ? "
+            "UNION ALL SELECT visit_ts, visit, service FROM outbox WHERE user_id = ? "
+            "ORDER BY 1, 2, 3",
+            (str(user_id),) * 2
+        )
+        return tuple(tuple(row) for row in rows)
+
+    def upcoming_by_user(
+        self,
+        user_id,
+        since_ts: float,
+        limit: int,
+        offset: int = 0
+    ) -> Tuple[List[Dict], int]:
+        """
+        User's visits at or after since_ts, nearest first.
+        Served by the (user_id, visit_ts) index, returns (page, total).
+        """
+        params = (str(user_id), since_ts)
+        where = "user_id = ? AND visit_ts >= ?"
+        page = self._select(where, params, order="visit_ts, pos", limit=limit, offset=offset)
+        total = self._conn.execute(
+            f"SELECT (SELECT COUNT(*) FROM bookings WHERE {where}) "
+            f"+ (SELECT COUNT(*) FROM outbox WHERE {where})",
+            params * 2
+        ).fetchone()[0]
+        return page, total
+
+    def upcoming(self, since_ts: float) -> List[Dict]:
+        """All visits at or after since_ts, nearest first (visit_ts index)"""
+        return self._select("visit_ts >= ?", (since_ts,), order="visit_ts, pos")
+
+    def between(self, start_ts: float, end_ts: float) -> List[Tuple[Optional[int], Dict]]:
+        """
+        Visits in [start_ts, end_ts) by time (visit_ts index), as
+        (worksheet row, record); the row is None for journaled bookings
+        """
+        columns = ', '.join(COLUMNS)
+        rows = self._conn.execute(
+            f"SELECT {columns}, row, visit_ts FROM bookings WHERE visit_ts >= ? AND visit_ts < ? "
+            f"UNION ALL SELECT {columns}, NULL, visit_ts FROM outbox WHERE visit_ts >= ? AND visit_ts < ? "
+            f"ORDER BY visit_ts",
+            (start_ts, end_ts) * 2
+        )
+        return [(row["row"], self._to_record(row)) for row in rows]
+
+    def index_entries(self) -> List[Tuple[str, Optional[float], str]]:
+        """(key, visit_ts, service) of every booking, key = 'r<row>' or 'o<booking ID>'"""
+        return list(self._conn.execute(
+            "SELECT 'r' || row, visit_ts, service FROM bookings "
+            "UNION ALL SELECT 'o' || seq, visit_ts, service FROM outbox"
+        ))
+
+    def count(self) -> int:
+        """O(1) after the first call: the writes keep the number current"""
+        if self._count is None:
+            self._count = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM bookings) + (SELECT COUNT(*) FROM outbox)"
+            ).fetchone()[0]
+        return self._count
@@ -0,0 +1,203 @@
+"""
+Rate-limited delivery of outgoing Telegram messages
+"""
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Dict, Optional, Union
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+    @property
+    def idle(self) -> bool:
+        """True if the bucket is full, i.e. it can be dropped and recreated"""
+        self._refill()
+        return self._tokens >= self.capacity
+
+
+class DeliveryService:
+    """
+    Worker pool for bot.send_message.
+
+    Messages are queued and sent by `workers` tasks. A global token bucket
+    keeps us under Telegram's bot-wide limit and a bucket per chat under the
+    per-chat one. TelegramRetryAfter pauses all workers for `retry_after`
+    seconds, network/5xx errors are retried with exponential backoff.
+    Other errors (blocked bot, bad chat) fail the message at once.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = 8,
+        global_rate: float = 25.0,
+        per_chat_rate: float = 1.0,
+        max_attempts: int = 5
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate)
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: list = []
+        self._paused_until = 0.0
+
+        # Counters
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"delivery-{n}")
+            for n in range(self.workers)
+        ]
+        logger.info(f"📬 Delivery workers started: {self.workers}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Try to drain the queue, then stop the workers"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self._queue.qsize()} messages left undelivered on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # --- public API ---
+
+    def submit(
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        priority: int = 10,
+        **kwargs: Any
+    ) -> asyncio.Future:
+        """
+        Queue a message without waiting. Lower priority is sent first.
+        The returned future resolves to True/False (delivered or not).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((
+            priority, next(self._seq),
+            (chat_id, text, kwargs, future, time.monotonic())
+        ))
+        return future
+
+    async def send(
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        priority: int = 10,
+        **kwargs: Any
+    ) -> bool:
+        """Queue a message and wait until it is delivered (or given up)"""
+        return await self.submit(chat_id, text, priority, **kwargs)
+
+    def stats(self) -> Dict[str, float]:
+        delivered = self.sent or 1
+        return {
+            "queue_depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "latency_avg": self.latency_total / delivered,
+            "latency_max": self.latency_max,
+        }
+
+    # --- internals ---
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 10_000:
+                # Drop buckets of chats that are quiet anyway
+                self._chats = {k: b for k, b in self._chats.items() if not b.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, (chat_id, text, kwargs, future, queued_at) = await self._queue.get()
+            try:
+                delivered = await self._deliver(chat_id, text, kwargs)
+                if delivered:
+                    self.sent += 1
+                    latency = time.monotonic() - queued_at
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                else:
+                    self.failed += 1
+                if not future.done():
+                    future.set_result(delivered)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, chat_id, text: str, kwargs: dict) -> bool:
+        backoff = 1.0
+        for attempt in range(1, self.max_attempts + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                # Flood control: hold every worker, not just this one
+                self.retried += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                logger.warning(f"⏳ Telegram flood control, retry after {e.retry_after}s")
+            except (TelegramNetworkError, TelegramServerError) as e:
+                self.retried += 1
+                logger.warning(f"⚠️ Send to {chat_id} failed (attempt {attempt}): {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            except Exception as e:
+                logger.warning(f"Failed to send message to {chat_id}: {e}")
+                return False
+        logger.error(f"❌ Giving up on message to {chat_id} after {self.max_attempts} attempts")
+        return False
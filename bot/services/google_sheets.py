@@ -1,16 +1,42 @@
 """
 Service for working with Google Sheets
 """
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
-from typing import Optional, List, Dict
+import asyncio
+import functools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Optional, List, Dict, Iterable, Sequence, Set, Tuple
 import logging
 
+from bot import metrics
+from bot.services.archive import BookingArchive
+from bot.services.booking_store import BookingStore
+from bot.services.sheets_quota import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_READ,
+    PRIORITY_WRITE,
+    QuotaGovernor,
+    api_status,
+    sheets_errors,
+)
+from bot.services.visit_time import parse_visit_datetime, to_iso
+
+if TYPE_CHECKING:
+    # gspread/oauth2client загружаются при первом подключении (_connect)
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
 logger = logging.getLogger(__name__)
 
 class GoogleSheetsService:
-    """Service for working with Google Sheets"""
+    """
+    Service for working with Google Sheets: reads from a local SQLite
+    mirror, journaled batched writes, all API calls through a thread pool
+    and the quota governor. One instance is shared by the whole process.
+    """
     
     SCOPES = [
         'https://spreadsheets.google.com/feeds',
@@ -26,24 +52,146 @@ class GoogleSheetsService:
         "Service", 
         "Visit Date/Time", 
         "User ID", 
-        "Username"
+        "Username",
+        "Visit ISO"  # машиночитаемое время визита, например 2026-01-16T15:00
     ]
     
-    def __init__(self, credentials_file: str, sheet_name: str):
+    def __init__(
+        self,
+        credentials_file: str,
+        sheet_name: str,
+        max_workers: int = 4,
+        timeout: float = 15.0,
+        db_path: str = "bookings.db",
+        max_staleness: float = 60.0,
+        quota_per_minute: float = 60.0,
+        archive: Optional[BookingArchive] = None
+    ):
         self.credentials_file = credentials_file
         self.sheet_name = sheet_name
-        self._client: Optional[gspread.Client] = None
-        self._sheet: Optional[gspread.Spreadsheet] = None
-        self._worksheet: Optional[gspread.Worksheet] = None
+        self.timeout = timeout
+        self.max_staleness = max_staleness
+        self.store = BookingStore(db_path, self.HEADERS)
+        self.governor = QuotaGovernor(quota_per_minute)
+        self.archive = archive
+        self._last_sync: Optional[float] = None
+        # Последняя неудачная синхронизация при чтении: до следующей попытки
+        # (не раньше чем через max_staleness) читаем из локальной копии
+        self._fresh_failed = float("-inf")
+        # Set during the startup warm-up: its full sync is on the way, reads
+        # are served from the copy on disk instead of syncing inline
+        self.warming_up = False
+        self._sync_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._pending_event = asyncio.Event()
+        # Callbacks fired with the sheet record of every new booking
+        self._booking_listeners: List[Callable[[Dict], Any]] = []
+        # Writes that timed out while their worker thread is still sending them
+        self._orphans: Set[asyncio.Future] = set()
+        # Journal left over from the previous run may be partly in the sheet
+        self._flush_suspect = self.store.pending_count() > 0
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="sheets"
+        )
+        self._credentials: Optional["ServiceAccountCredentials"] = None
+        self._client: Optional["gspread.Client"] = None
+        self._sheet: Optional["gspread.Spreadsheet"] = None
+        self._worksheet: Optional["gspread.Worksheet"] = None
+        self._connect_lock = threading.Lock()
+        self._headers_ready = False
+    
+    async def _run(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        priority: int = PRIORITY_READ,
+        key: Optional[Tuple] = None,
+        idempotent: bool = True
+    ) -> Any:
+        """
+        Run a Sheets API request through the quota governor.
+        Requests with the same `key` in flight at once are sent only once.
+        """
+        return await self.governor.call(
+            functools.partial(self._execute, func, *args, timeout=timeout, idempotent=idempotent),
+            priority=priority,
+            key=key,
+            idempotent=idempotent
+        )
+    
+    async def _execute(
+        self,
+        func: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        idempotent: bool = True
+    ) -> Any:
+        """
+        Run a blocking gspread call in the worker pool.
+
+        Raises asyncio.TimeoutError if Google does not answer in time.
+        Cancelling the awaiting task releases the caller immediately; the
+        worker thread finishes on its own (the HTTP timeout bounds it).
+        A non-idempotent call that timed out is kept in _orphans until its
+        thread finishes, since the write may still reach the sheet.
+        """
+        op = func.__name__.lstrip("_")
+        future = asyncio.wrap_future(self._executor.submit(functools.partial(func, *args)))
+        # Исход потока нужен только _orphans; не шумим "exception was never retrieved"
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        try:
+            with metrics.SHEETS_SECONDS.labels(op).time(f"sheets.{op}"):
+                return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except sheets_errors() as e:
+            metrics.SHEETS_ERRORS.labels(op).inc()
+            self._reset_on_failure(e)
+            raise
+        except asyncio.TimeoutError:
+            metrics.SHEETS_ERRORS.labels(op).inc()
+            if not idempotent and not future.done():
+                self._orphans.add(future)
+                future.add_done_callback(self._orphans.discard)
+            raise
+    
+    def _reset_on_failure(self, error: Exception) -> None:
+        """Forget a dead connection so the next call opens a new one"""
+        status = api_status(error)
+        # 401 - token revoked, 404 - spreadsheet re-created or moved
+        if status is not None and status not in (401, 404):
+            return
+        if self._worksheet is not None:
+            logger.warning(f"⚠️ Google Sheets connection reset after error: {error!r}")
+        self._worksheet = None
+        self._sheet = None
+        self._client = None
+        self._headers_ready = False
+    
+    def close(self) -> None:
+        """Stop the worker pool and close the local mirror"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
     
     def _connect(self) -> None:
         """Connect to Google Sheets"""
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        from requests.adapters import HTTPAdapter
         try:
-            credentials = ServiceAccountCredentials.from_json_keyfile_name(
-                self.credentials_file, 
-                self.SCOPES
-            )
-            self._client = gspread.authorize(credentials)
+            # Ключ читаем один раз, при переподключении используем повторно
+            if self._credentials is None:
+                self._credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                    self.credentials_file, 
+                    self.SCOPES
+                )
+            self._client = gspread.authorize(self._credentials)
+            # Keep-alive pool sized to the worker threads
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+            self._client.http_client.session.mount("https://", adapter)
+            # HTTP timeout keeps worker threads from hanging forever
+            self._client.http_client.set_timeout(self.timeout)
             self._sheet = self._client.open(self.sheet_name)
             self._worksheet = self._sheet.sheet1
             logger.info("✅ Successfully connected to Google Sheets")
@@ -51,29 +199,414 @@ class GoogleSheetsService:
             logger.error(f"❌ Error connecting to Google Sheets: {e}")
             raise
     
-    def _ensure_connection(self) -> None:
+    def _ensure_connection(self) -> "gspread.Worksheet":
         """Check and restore connection"""
-        if self._worksheet is None:
-            self._connect()
+        with self._connect_lock:
+            if self._worksheet is None:
+                self._connect()
+            return self._worksheet
     
-    def _ensure_headers(self) -> None:
-        """Check and create headers"""
-        self._ensure_connection()
+    async def connect(self) -> None:
+        """Connect now (OAuth handshake, spreadsheet open, header check) instead of on first use"""
+        await self._run(self._ensure_headers, key=("connect",))
+    
+    def _refresh_token_if_expiring(self, margin: timedelta) -> bool:
+        """Refresh the access token ahead of expiry, returns True if refreshed"""
+        with self._connect_lock:
+            if self._client is None:
+                self._connect()
+            http_client = self._client.http_client
+            auth = http_client.auth
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if auth.token and auth.expiry and auth.expiry - now > margin:
+            return False
+        from google.auth.transport.requests import Request
+        auth.refresh(Request(http_client.session))
+        return True
+    
+    async def keep_alive(self, interval: float = 60.0, margin: float = 300.0) -> None:
+        """
+        Background task: refresh the OAuth token before it expires,
+        so a user request never pays for the token round trip.
+        """
+        while True:
+            try:
+                # OAuth, not the Sheets API: no quota to spend
+                refreshed = await self._execute(
+                    self._refresh_token_if_expiring, timedelta(seconds=margin)
+                )
+                if refreshed:
+                    logger.info("🔑 Google access token refreshed")
+            except Exception as e:
+                logger.warning(f"⚠️ Google token refresh failed: {e!r}")
+            await asyncio.sleep(interval)
+    
+    def _ensure_headers(self) -> "gspread.Worksheet":
+        """Check and create headers (once per connection)"""
+        worksheet = self._ensure_connection()
+        if self._headers_ready:
+            return worksheet
         
         try:
-            first_row = self._worksheet.row_values(1)
+            first_row = worksheet.row_values(1)
+            # Старая таблица без новых колонок: дописываем недостающие заголовки
+            if first_row and first_row == self.HEADERS[:len(first_row)] and len(first_row) < len(self.HEADERS):
+                worksheet.update(values=[self.HEADERS], range_name='A1:I1')
+                logger.info("✅ Headers extended")
             # Если первая строка пустая или заголовки не те
             if not first_row:
-                self._worksheet.append_row(self.HEADERS)
+                worksheet.append_row(self.HEADERS)
                 # Форматирование заголовков (синий фон, белый текст)
-                self._worksheet.format('A1:H1', {
+                worksheet.format('A1:I1', {
                     "backgroundColor": {"red": 0.2, "green": 0.5, "blue": 0.9},
                     "textFormat": {"bold": True, "foregroundColor": {"red": 1, "green": 1, "blue": 1}},
                     "horizontalAlignment": "CENTER"
                 })
                 logger.info("✅ Headers created")
+            self._headers_ready = True
         except Exception as e:
             logger.error(f"❌ Error creating headers: {e}")
+        return worksheet
+    
+    @staticmethod
+    def _row_from_range(updated_range: str) -> Optional[int]:
+        """'Sheet1!A5:H5' -> 5"""
+        match = re.search(r"![A-Z]+(\d+)", updated_range or "")
+        return int(match.group(1)) if match else None
+    
+    def _append_rows(self, rows: List[list]) -> Optional[int]:
+        """Append a batch in one request, returns the row number of the first one"""
+        worksheet = self._ensure_headers()
+        response = worksheet.append_rows(rows)
+        updated_range = response.get("updates", {}).get("updatedRange", "")
+        return self._row_from_range(updated_range)
+    
+    @staticmethod
+    def _contiguous(numbers: List[int]) -> List[Tuple[int, int]]:
+        """[2, 3, 4, 7, 9, 10] -> [(2, 4), (7, 7), (9, 10)]"""
+        ranges: List[List[int]] = []
+        for number in sorted(numbers):
+            if ranges and ranges[-1][1] == number - 1:
+                ranges[-1][1] = number
+            else:
+                ranges.append([number, number])
+        return [(first, last) for first, last in ranges]
+    
+    def _delete_rows(self, rows: List[Tuple[int, str]], ranges: List[Tuple[int, int]]) -> None:
+        """
+        Delete row ranges, checking first that the (row number, booking ID)
+        pairs are still in place (the admin panel may have moved rows meanwhile)
+        """
+        worksheet = self._ensure_connection()
+        value_range = worksheet.batch_get(["A1:A"], major_dimension="COLUMNS")[0]
+        ids = value_range[0] if value_range else []
+        for number, booking_id in rows:
+            if number > len(ids) or ids[number - 1] != booking_id:
+                raise RuntimeError(f"row {number} changed since it was read, archiving aborted")
+        
+        # Снизу вверх: удаление не сдвигает еще не удаленные строки.
+        # Один batchUpdate - Google применяет его целиком или никак
+        worksheet.client.batch_update(worksheet.spreadsheet_id, {"requests": [
+            {"deleteDimension": {"range": {
+                "sheetId": worksheet.id,
+                "dimension": "ROWS",
+                "startIndex": first - 1,
+                "endIndex": last,
+            }}}
+            for first, last in sorted(ranges, reverse=True)
+        ]})
+    
+    def _batch_get(self, ranges: List[str], major_dimension: Optional[str] = None) -> list:
+        return self._ensure_connection().batch_get(ranges, major_dimension=major_dimension)
+    
+    @classmethod
+    def column_letter(cls, header: str) -> str:
+        """'Visit ISO' -> 'I' (the sheet has fewer than 27 columns)"""
+        return chr(ord("A") + cls.HEADERS.index(header))
+    
+    async def read_columns(
+        self,
+        headers: Sequence[str],
+        first_row: int = 2,
+        last_row: Optional[int] = None,
+        priority: int = PRIORITY_READ
+    ) -> Dict[str, Tuple[str, ...]]:
+        """
+        Fetch only the given columns of rows first_row..last_row (to the end
+        by default) in one batch_get request, column-major.
+        Returns {header: tuple of cell values}, all tuples of equal length;
+        element i belongs to sheet row first_row + i.
+        """
+        end = last_row if last_row is not None else ""
+        ranges = [f"{letter}{first_row}:{letter}{end}" for letter in map(self.column_letter, headers)]
+        value_ranges = await self._run(
+            self._batch_get, ranges, "COLUMNS", priority=priority, key=("batch_get", *ranges)
+        )
+        columns = [tuple(value_range[0]) if value_range else () for value_range in value_ranges]
+        # Google не возвращает пустые ячейки в конце колонки - выравниваем
+        length = max(map(len, columns), default=0)
+        return {
+            header: column + ("",) * (length - len(column))
+            for header, column in zip(headers, columns)
+        }
+    
+    async def read_rows(
+        self,
+        ranges: Sequence[Tuple[int, int]],
+        priority: int = PRIORITY_READ
+    ) -> Dict[int, list]:
+        """Full rows of the given (first, last) row ranges, by row number"""
+        last_column = self.column_letter(self.HEADERS[-1])
+        a1 = [f"A{first}:{last_column}{last}" for first, last in ranges]
+        value_ranges = []
+        # Диапазоны идут в URL запроса, поэтому не больше сотни за раз
+        for start in range(0, len(a1), 100):
+            value_ranges += await self._run(self._batch_get, a1[start:start + 100], priority=priority)
+        rows: Dict[int, list] = {}
+        for (first, last), value_range in zip(ranges, value_ranges):
+            for number, values in zip(range(first, last + 1), list(value_range) + [[]] * (last - first + 1)):
+                rows[number] = values
+        return rows
+    
+    def _get_all_values(self) -> list:
+        return self._ensure_connection().get_all_values()
+    
+    def _get_values_from(self, first_row: int) -> list:
+        return self._ensure_connection().get_values(f"A{first_row}:I")
+    
+    def _get_values_between(self, first_row: int, last_row: int) -> list:
+        return self._ensure_connection().get_values(f"A{first_row}:I{last_row}")
+    
+    def _row_count(self) -> int:
+        worksheet = self._ensure_connection()
+        # worksheet.row_count - на момент открытия, append_rows его не обновляет
+        meta = worksheet.client.fetch_sheet_metadata(worksheet.spreadsheet_id)
+        for sheet in meta["sheets"]:
+            if sheet["properties"]["sheetId"] == worksheet.id:
+                return sheet["properties"]["gridProperties"]["rowCount"]
+        return worksheet.row_count
+    
+    async def row_count(self, priority: int = PRIORITY_BACKGROUND) -> int:
+        """Rows in the worksheet grid now (one metadata request)"""
+        return await self._run(self._row_count, priority=priority, key=("row_count",))
+    
+    async def read_page(
+        self,
+        first_row: int,
+        count: int,
+        priority: int = PRIORITY_BACKGROUND
+    ) -> list:
+        """
+        Rows first_row..first_row + count - 1 in one request. Google drops
+        empty rows at the end of the range, so a short page may still be
+        followed by data: page up to row_count() instead.
+        """
+        return await self._run(
+            self._get_values_between, first_row, first_row + count - 1, priority=priority
+        )
+    
+    async def append_bulk(self, rows: List[list]) -> Optional[int]:
+        """
+        Append rows straight to the sheet, bypassing the journal (bulk import).
+        Paced as background work; the mirror picks them up with the next sync.
+        Returns the row number of the first one.
+        """
+        return await self._run(
+            self._append_rows, rows, priority=PRIORITY_BACKGROUND, idempotent=False
+        )
+    
+    async def sync(self, full: bool = False, priority: int = PRIORITY_READ) -> None:
+        """
+        Reconcile the local mirror with the sheet.
+        Incremental mode downloads only the rows after the last synced one;
+        it is skipped if another sync finished while this one waited.
+        """
+        requested = time.monotonic()
+        async with self._sync_lock:
+            last_row = self.store.last_row
+            synced = self._last_sync
+            if not full and last_row is not None and synced is not None and synced >= requested:
+                return
+            if full or last_row is None:
+                values = await self._run(
+                    self._get_all_values, priority=priority, key=("values",)
+                )
+                self.store.replace_all(values)
+                last_row = self.store.last_row
+            
+            # Rows appended while a full download was in flight are picked up here too
+            first_row = last_row + 1
+            values = await self._run(
+                self._get_values_from, first_row, priority=priority, key=("values", first_row)
+            )
+            added = self.store.apply_tail(first_row, values)
+            if added:
+                logger.info(f"🔄 Pulled {added} new rows from Google Sheets")
+            self._last_sync = time.monotonic()
+    
+    async def ensure_mirror(self) -> None:
+        """Download the sheet if there is no local copy yet; no network otherwise"""
+        if self.store.last_row is None:
+            await self.sync(full=True)
+    
+    async def _ensure_fresh(self) -> None:
+        """
+        Sync inline only if the background loop has not done it recently.
+        If that sync fails the read is served from the local mirror.
+        """
+        if self.store.last_row is None:
+            await self.sync(full=True)
+            return
+        now = time.monotonic()
+        if self.warming_up or now - self._fresh_failed < self.max_staleness:
+            return
+        if self._last_sync is None or now - self._last_sync > self.max_staleness:
+            # Ретраи при сбоях Google читатель не ждет дольше одного таймаута
+            sync = asyncio.ensure_future(self.sync())
+            sync.add_done_callback(lambda done: done.cancelled() or done.exception())
+            try:
+                await asyncio.wait_for(asyncio.shield(sync), self.timeout)
+            except Exception as e:
+                self._fresh_failed = time.monotonic()
+                logger.warning(f"⚠️ Sync failed, serving the local mirror: {e!r}")
+    
+    async def sync_forever(self, interval: float, full_every: int, first_cycle: int = 0) -> None:
+        """
+        Background reconcile loop: tail pulls, plus a full resync every N cycles
+        (first_cycle=1 starts with a tail pull, after a full sync at warm-up)
+        """
+        cycle = first_cycle
+        while True:
+            try:
+                await self.sync(full=cycle % full_every == 0, priority=PRIORITY_BACKGROUND)
+            except Exception as e:
+                logger.error(f"❌ Error syncing local mirror: {e!r}")
+            cycle += 1
+            await asyncio.sleep(interval)
+    
+    async def archive_past(self, before: date) -> int:
+        """
+        Move bookings with visits in months before `before` from the sheet
+        into the archive. Returns the number of rows moved.
+        """
+        async with self._flush_lock, self._sync_lock:
+            # Решаем по трем колонкам, целиком читаем только уходящие строки
+            columns = await self.read_columns(
+                ("ID", "Visit Date/Time", "Visit ISO"), priority=PRIORITY_BACKGROUND
+            )
+            partitions = self.archive.split(columns, before)
+            if not partitions:
+                return 0
+            
+            rows = sorted(row for month_rows in partitions.values() for row in month_rows)
+            ranges = self._contiguous([number for number, _ in rows])
+            full_rows = await self.read_rows(ranges, priority=PRIORITY_BACKGROUND)
+            
+            # Сначала архив (на диск), потом удаление из таблицы: при сбое между
+            # ними строка окажется в двух местах, но не потеряется
+            for month, month_rows in sorted(partitions.items()):
+                await asyncio.to_thread(
+                    self.archive.write, month, [full_rows[number] for number, _ in month_rows]
+                )
+            await self._run(
+                self._delete_rows, rows, ranges, priority=PRIORITY_BACKGROUND, idempotent=False
+            )
+            
+            # Номера строк сдвинулись, зеркало строим заново
+            values = await self._run(self._get_all_values, priority=PRIORITY_BACKGROUND)
+            self.store.replace_all(values)
+            self._last_sync = time.monotonic()
+        logger.info(
+            f"🗃 Moved {len(rows)} past bookings ({len(partitions)} months) "
+            f"to the archive ({len(ranges)} row ranges)"
+        )
+        return len(rows)
+    
+    async def archive_forever(self, interval: float) -> None:
+        """Background task: archive months that are over, every `interval` seconds"""
+        while True:
+            try:
+                await self.archive_past(date.today().replace(day=1))
+            except Exception as e:
+                logger.error(f"❌ Error archiving past bookings: {e!r}")
+            await asyncio.sleep(interval)
+    
+    def add_booking_listener(self, callback: Callable[[Dict], Any]) -> None:
+        """Register a callback for new bookings (gets a dict keyed by HEADERS)"""
+        self._booking_listeners.append(callback)
+    
+    def _notify_booking_added(self, row_data: list) -> None:
+        record = dict(zip(self.HEADERS, (str(value) for value in row_data)))
+        for callback in self._booking_listeners:
+            try:
+                callback(record)
+            except Exception as e:
+                logger.error(f"❌ Booking listener failed: {e!r}")
+    
+    async def flush_pending(self, max_batch: int = 50) -> int:
+        """
+        Append journaled bookings to the sheet with one append_rows call.
+        Returns the number of rows written.
+        """
+        async with self._flush_lock:
+            if self._flush_suspect:
+                # A previous append may have landed without us seeing the response;
+                # one that timed out may still be on its way - wait for it first
+                if self._orphans:
+                    await asyncio.wait(list(self._orphans), timeout=self.timeout)
+                    if self._orphans:
+                        raise asyncio.TimeoutError("a timed-out append is still in flight")
+                await self.sync()
+                dropped = self.store.drop_flushed()
+                if dropped:
+                    logger.warning(f"⚠️ {dropped} journaled bookings were already in the sheet")
+                self._flush_suspect = False
+            
+            batch = self.store.pending(max_batch)
+            if not batch:
+                return 0
+            try:
+                first_row = await self._run(
+                    self._append_rows,
+                    [values for _, values in batch],
+                    priority=PRIORITY_WRITE,
+                    idempotent=False
+                )
+            except Exception:
+                self._flush_suspect = True
+                raise
+            self.store.mark_flushed(first_row, batch)
+            logger.info(f"📤 Flushed {len(batch)} bookings to Google Sheets")
+            return len(batch)
+    
+    async def flush_forever(self, max_batch: int, max_delay: float) -> None:
+        """
+        Background flusher: waits for a burst to fill a batch (or max_delay
+        to pass), then writes it. Backs off exponentially while Google fails.
+        """
+        loop = asyncio.get_running_loop()
+        backoff = 1.0
+        while True:
+            if not self.store.pending_count():
+                self._pending_event.clear()
+                await self._pending_event.wait()
+            
+            # Coalesce the burst into one request
+            deadline = loop.time() + max_delay
+            while self.store.pending_count() < max_batch and loop.time() < deadline:
+                self._pending_event.clear()
+                try:
+                    await asyncio.wait_for(self._pending_event.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.flush_pending(max_batch)
+                backoff = 1.0
+            except Exception as e:
+                logger.error(f"❌ Error flushing bookings ({self.store.pending_count()} pending): {e!r}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
     
     async def add_booking(
         self, 
@@ -85,18 +618,22 @@ class GoogleSheetsService:
         username: str = ""
     ) -> dict:
         """
-        Add booking to the sheet
+        Add booking: journaled locally and returned at once,
+        written to the sheet by flush_forever()
         """
-        self._ensure_headers()
-        
         try:
-            # Generate booking ID
-            all_records = self._worksheet.get_all_values()
-            booking_id = len(all_records)  # Booking number (row count including header)
-            
             # Current date and time
             created_at = datetime.now().strftime("%d.%m.%Y %H:%M")
             
+            # Generate booking ID from the local counter, no sheet scan.
+            # Counter must be seeded from the sheet at least once.
+            if self.store.last_row is None:
+                await self.sync(full=True)
+            booking_id = self.store.next_booking_id()
+            
+            # Parse once here, the ISO column spares everyone else the string work
+            visit_dt = parse_visit_datetime(date_time)
+            
             # Data for the row
             row_data = [
                 booking_id,
@@ -106,13 +643,17 @@ class GoogleSheetsService:
                 service,
                 date_time,
                 user_id,
-                username
+                username,
+                to_iso(visit_dt) if visit_dt else ""
             ]
             
-            # Append row
-            self._worksheet.append_row(row_data)
+            # Journal first: the booking survives a crash or a Google outage,
+            # the background flusher appends it to the sheet
+            self.store.enqueue(booking_id, row_data)
+            self._pending_event.set()
+            self._notify_booking_added(row_data)
             
-            logger.info(f"✅ Booking #{booking_id} added: {name} - {service}")
+            logger.info(f"✅ Booking #{booking_id} accepted: {name} - {service}")
             
             return {
                 "id": booking_id,
@@ -124,37 +665,51 @@ class GoogleSheetsService:
             }
             
         except Exception as e:
-            logger.error(f"❌ Error adding booking: {e}")
+            logger.error(f"❌ Error adding booking: {e!r}")
             raise
     
-    def get_all_bookings(self) -> list:
+    async def get_all_bookings(self) -> list:
         """Get all bookings"""
-        self._ensure_connection()
-        return self._worksheet.get_all_records()
+        await self._ensure_fresh()
+        return self.store.all()
     
-    def get_bookings_count(self) -> int:
-        """Get bookings count"""
-        self._ensure_connection()
-        return len(self._worksheet.get_all_values()) - 1 
+    async def get_bookings_count(self) -> int:
+        """Get bookings count (kept by the mirror, no scan)"""
+        await self._ensure_fresh()
+        return self.store.count()
     
-    def get_bookings_by_user(self, user_id: int) -> List[Dict]:
+    async def get_bookings_by_user(
+        self,
+        user_id: int,
+        months: Optional[Iterable[str]] = None
+    ) -> List[Dict]:
         """
         Получение всех записей конкретного пользователя.
+        `months` (YYYY-MM) limits which archive partitions are read.
         """
-        # Сначала получаем вообще все записи
-        all_records = self.get_all_bookings()
-        
-        user_bookings = []
-        # Превращаем ID пользователя в строку для надежного сравнения
-        target_id = str(user_id)
-        
-        for record in all_records:
-            # Получаем ID из строки (ключ должен совпадать с заголовком HEADERS)
-            # Используем .get с защитой от пустых значений
-            row_user_id = str(record.get("User ID") or record.get("user_id") or "")
-            
-            # Сравниваем строки
-            if row_user_id == target_id:
-                user_bookings.append(record)
-                
-        return user_bookings
\ No newline at end of file
+        # Индекс по User ID в локальной базе, без скачивания всей таблицы
+        await self._ensure_fresh()
+        bookings = self.store.by_user(user_id)
+        if self.archive is not None:
+            # История прошлых месяцев - только из разделов, где есть этот пользователь
+            archived = await asyncio.to_thread(self.archive.by_user, user_id, months)
+            bookings = archived + bookings
+        return bookings
+    
+    async def get_upcoming_bookings(self, since: Optional[float] = None) -> List[Dict]:
+        """All visits from `since` (epoch, default now) on, nearest first"""
+        await self._ensure_fresh()
+        return self.store.upcoming(time.time() if since is None else since)
+    
+    async def get_upcoming_bookings_by_user(
+        self,
+        user_id: int,
+        limit: int = 5,
+        offset: int = 0
+    ) -> Tuple[List[Dict], int]:
+        """
+        Future visits of the user, nearest first, one page at a time.
+        Returns (bookings, total number of upcoming bookings).
+        """
+        await self._ensure_fresh()
+        return self.store.upcoming_by_user(user_id, time.time(), limit, offset)
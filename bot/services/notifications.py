@@ -0,0 +1,108 @@
+"""
+Admin notifications about new bookings, coalesced into digests
+"""
+import asyncio
+import html
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from bot import metrics
+from bot.services.delivery import DeliveryService
+
+logger = logging.getLogger(__name__)
+
+# Сколько записей перечислять в одном дайджесте (лимит сообщения - 4096 символов)
+DIGEST_MAX_ITEMS = 25
+
+
+def format_digest(bookings: List[Dict], window: float) -> str:
+    """One message for a burst: count, per-service breakdown and the list"""
+    services = Counter(booking['service'] for booking in bookings)
+    lines = [f"📦 <b>Нових записів: {len(bookings)}</b> (за {window:g} с)", ""]
+    lines += [f"💼 {html.escape(service)}: {count}" for service, count in services.most_common()]
+    lines.append("")
+    for booking in bookings[:DIGEST_MAX_ITEMS]:
+        lines.append(
+            f"#{booking['id']} · {html.escape(str(booking['date_time']))} · "
+            f"{html.escape(str(booking['name']))} · {html.escape(str(booking['service']))}"
+        )
+    if len(bookings) > DIGEST_MAX_ITEMS:
+        lines.append(f"… і ще {len(bookings) - DIGEST_MAX_ITEMS}")
+    return "\n".join(lines)
+
+
+class AdminNotifier:
+    """
+    Queue of new-booking alerts for the admin chat.
+
+    notify() only puts the booking on an asyncio queue, the handler never
+    waits for Telegram. A single task sends them: when the chat has been
+    quiet for `window` seconds an alert goes out at once, as before; during
+    a burst the alerts that arrive within `window` of the last message are
+    collected and sent as one digest. So the admin chat gets at most one
+    message per window and the rest of the Telegram rate budget is left
+    to the user confirmations.
+    """
+
+    def __init__(self, delivery: DeliveryService, chat_id: int, window: float = 30.0):
+        self.delivery = delivery
+        self.chat_id = chat_id
+        self.window = window
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sent = float("-inf")
+        # Взятое из очереди, но еще не отправленное (не теряем при остановке)
+        self._held: List[Tuple[Dict, str]] = []
+
+    def start(self) -> None:
+        if self.chat_id and self._task is None:
+            self._task = asyncio.create_task(self._run(), name="admin-notifier")
+
+    async def stop(self) -> None:
+        """Send what is still queued right away, then stop"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._send(self._held + self._drain())
+        self._held = []
+
+    def notify(self, booking: Dict, text: str) -> None:
+        """
+        Queue an alert about a booking (dict as returned by add_booking);
+        `text` is the full message used when it is sent on its own
+        """
+        if self.chat_id:
+            self._queue.put_nowait((booking, text))
+
+    def _drain(self) -> List[Tuple[Dict, str]]:
+        items = []
+        while not self._queue.empty():
+            items.append(self._queue.get_nowait())
+        return items
+
+    def _send(self, items: List[Tuple[Dict, str]]) -> None:
+        if not items:
+            return
+        if len(items) == 1:
+            text = items[0][1]
+            metrics.ADMIN_NOTIFICATIONS.labels("single").inc()
+        else:
+            text = format_digest([booking for booking, _ in items], self.window)
+            metrics.ADMIN_NOTIFICATIONS.labels("digest").inc()
+            logger.info(f"📦 {len(items)} booking alerts sent as one digest")
+        self.delivery.submit(self.chat_id, text, parse_mode="HTML")
+        self._last_sent = time.monotonic()
+
+    async def _run(self) -> None:
+        while True:
+            self._held = [await self._queue.get()]
+            # Тихо - сразу; иначе копим до конца окна после прошлого сообщения
+            wait = self._last_sent + self.window - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._send(self._held + self._drain())
+            self._held = []
@@ -0,0 +1,106 @@
+"""
+Cache of rendered "My bookings" pages
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from bot import metrics
+from bot.services.google_sheets import GoogleSheetsService
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("pages", "snapshot", "version", "expires")
+
+    def __init__(self, snapshot: tuple, version: int, expires: float):
+        self.pages: Dict[Hashable, Any] = {}
+        self.snapshot = snapshot
+        self.version = version
+        self.expires = expires
+
+
+class UserPageCache:
+    """
+    Rendered pages per user, TTL + LRU over users (at most `max_users`).
+
+    A booking made through the bot drops the user's pages at once (booking
+    listener). After a sheet sync an entry is checked on its next read: the
+    user's bookings are compared with the snapshot taken when it was
+    rendered (one indexed query), so only users whose rows actually changed
+    are re-rendered. Entries also expire at `expires` (e.g. when the
+    nearest visit passes and leaves the list) or after `ttl` seconds.
+    """
+
+    def __init__(self, sheets: GoogleSheetsService, max_users: int = 2048, ttl: float = 300.0):
+        self.sheets = sheets
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        sheets.add_booking_listener(self._on_booking_added)
+
+    def _on_booking_added(self, booking: Dict) -> None:
+        self.invalidate(booking.get("User ID"))
+
+    def invalidate(self, user_id) -> None:
+        if self._entries.pop(str(user_id), None) is not None:
+            self.invalidations += 1
+            metrics.PAGE_CACHE.labels("invalidated").inc()
+
+    def _valid(self, user_id: str, entry: _Entry) -> bool:
+        if time.time() >= entry.expires:
+            return False
+        store = self.sheets.store
+        if entry.version != store.sync_version:
+            if store.user_snapshot(user_id) != entry.snapshot:
+                return False
+            entry.version = store.sync_version
+        return True
+
+    def get(self, user_id, page: Hashable) -> Optional[Any]:
+        key = str(user_id)
+        entry = self._entries.get(key)
+        if entry is not None and not self._valid(key, entry):
+            del self._entries[key]
+            entry = None
+        value = entry.pages.get(page) if entry is not None else None
+        if value is None:
+            self.misses += 1
+            metrics.PAGE_CACHE.labels("miss").inc()
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        metrics.PAGE_CACHE.labels("hit").inc()
+        return value
+
+    def put(self, user_id, page: Hashable, value: Any, expires: Optional[float] = None) -> None:
+        """Store a rendered page; `expires` (epoch) can only shorten the TTL"""
+        key = str(user_id)
+        deadline = time.time() + self.ttl
+        if expires is not None:
+            deadline = min(deadline, expires)
+        entry = self._entries.get(key)
+        if entry is None:
+            store = self.sheets.store
+            entry = self._entries[key] = _Entry(store.user_snapshot(key), store.sync_version, deadline)
+            if len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        else:
+            entry.expires = min(entry.expires, deadline)
+        entry.pages[page] = value
+        self._entries.move_to_end(key)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
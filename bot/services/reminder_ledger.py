@@ -0,0 +1,107 @@
+"""
+Persistent record of reminder deliveries
+"""
+import sqlite3
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Состояния доставки
+SENT = "sent"
+FAILED = "failed"    # Telegram refused (user blocked the bot etc.), do not retry
+SKIPPED = "skipped"  # superseded by a later reminder during catch-up
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminder_log (
+    booking_key TEXT,
+    kind        TEXT,
+    state       TEXT,
+    visit_ts    REAL,
+    updated     REAL,
+    PRIMARY KEY (booking_key, kind)
+);
+CREATE TABLE IF NOT EXISTS reminder_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+Slot = Tuple[str, str]
+
+
+class ReminderLedger:
+    """
+    (booking, reminder kind) -> delivery state and the visit time it was for.
+
+    The whole ledger is loaded into a dict on start, so lookups are O(1);
+    every change is written to SQLite right away. Entries of visits that
+    are long over are pruned. An entry for another visit time (the admin
+    moved the booking) does not count as done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._states: Dict[Slot, Tuple[str, float]] = {
+            (key, kind): (state, visit_ts)
+            for key, kind, state, visit_ts in self._conn.execute(
+                "SELECT booking_key, kind, state, visit_ts FROM reminder_log"
+            )
+        }
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __contains__(self, slot: Slot) -> bool:
+        return slot in self._states
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def state(self, slot: Slot) -> Optional[str]:
+        entry = self._states.get(slot)
+        return entry[0] if entry else None
+
+    def done(self, slot: Slot, visit_ts: float) -> bool:
+        """Whether the reminder for this visit time was already handled"""
+        entry = self._states.get(slot)
+        return entry is not None and entry[1] == visit_ts
+
+    def mark(self, slot: Slot, state: str, visit_ts: float) -> None:
+        self._states[slot] = (state, visit_ts)
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reminder_log VALUES (?, ?, ?, ?, ?)",
+                (*slot, state, visit_ts, time.time())
+            )
+
+    def prune(self, before_ts: float) -> None:
+        """Forget deliveries for visits before before_ts"""
+        with self._conn:
+            rows = self._conn.execute(
+                "DELETE FROM reminder_log WHERE visit_ts < ? RETURNING booking_key, kind",
+                (before_ts,)
+            ).fetchall()
+        for key, kind in rows:
+            self._states.pop((key, kind), None)
+
+    # --- liveness, to know which reminders came due while the bot was down ---
+
+    @property
+    def last_alive(self) -> Optional[float]:
+        row = self._conn.execute(
+            "SELECT value FROM reminder_meta WHERE key = 'last_alive'"
+        ).fetchone()
+        return float(row[0]) if row else None
+
+    def heartbeat(self) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reminder_meta VALUES ('last_alive', ?)",
+                (str(time.time()),)
+            )
@@ -0,0 +1,193 @@
+"""
+Quota governor for Google Sheets API traffic
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: меньше - раньше
+PRIORITY_WRITE = 0        # запись новых броней
+PRIORITY_READ = 10        # чтение, которого ждет пользователь
+PRIORITY_BACKGROUND = 20  # фоновая синхронизация, сверка напоминаний
+
+
+def sheets_errors() -> Tuple[type, ...]:
+    """
+    API and transport errors of the Sheets client, for `except`.
+    gspread takes a few hundred ms to import, so it is imported on first
+    use (by then the connection has already loaded it).
+    """
+    from gspread.exceptions import APIError
+    from requests.exceptions import RequestException
+    return APIError, RequestException
+
+
+def api_status(error: Exception) -> Optional[int]:
+    """HTTP status of a Sheets API error, None for transport errors"""
+    from gspread.exceptions import APIError
+    if isinstance(error, APIError):
+        return error.response.status_code
+    return None
+
+
+class QuotaGovernor:
+    """
+    Single gate for all Sheets API requests of the process.
+
+    - token bucket: `per_minute` requests per minute (the per-user quota
+      of the service account), bursts up to `burst`;
+    - priority lanes: when tokens are short, the lowest priority number
+      goes first, so booking writes are not stuck behind background reads;
+    - single-flight: concurrent calls with the same `key` share one
+      request and its result;
+    - 429 and 5xx are retried with exponential backoff and jitter; a 429
+      also pauses the whole gate, since the quota is shared.
+
+    Non-idempotent calls (appends) are retried only on 429, which Google
+    returns before applying the request.
+    """
+
+    def __init__(
+        self,
+        per_minute: float = 60.0,
+        burst: Optional[float] = None,
+        max_attempts: int = 5,
+        max_backoff: float = 32.0
+    ):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, per_minute / 6)
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        # Counters
+        self.requests = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.throttled = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self) -> float:
+        """Seconds until the head of the queue may go"""
+        self._refill()
+        delay = self._paused_until - time.monotonic()
+        if self._tokens < 1:
+            delay = max(delay, (1 - self._tokens) / self.rate)
+        return delay
+
+    async def _acquire(self, priority: int) -> None:
+        entry = (priority, next(self._seq))
+        async with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiting[0] == entry:
+                        timeout = self._delay()
+                        if timeout <= 0:
+                            heapq.heappop(self._waiting)
+                            self._tokens -= 1
+                            # Следующий в очереди проверит токены сам
+                            self._cond.notify_all()
+                            return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _execute(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        priority: int,
+        idempotent: bool
+    ) -> Any:
+        attempt = 0
+        while True:
+            await self._acquire(priority)
+            self.requests += 1
+            try:
+                return await func()
+            except sheets_errors() as e:
+                status = api_status(e)
+                retryable = status == 429 or (
+                    idempotent and (status is None or status >= 500)
+                )
+                attempt += 1
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                delay = min(2 ** attempt, self.max_backoff) * (0.5 + random.random() / 2)
+                if status == 429:
+                    self.throttled += 1
+                    async with self._cond:
+                        self._pause(delay)
+                self.retried += 1
+                logger.warning(
+                    f"⏳ Sheets request failed ({status or type(e).__name__}), "
+                    f"retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_READ,
+        key: Optional[Hashable] = None,
+        idempotent: bool = True
+    ) -> Any:
+        """
+        Run `func` (a coroutine factory doing one API request) through the gate.
+        Calls with the same `key` made while one is in flight get its result.
+        """
+        if key is None:
+            return await self._execute(func, priority, idempotent)
+
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            return await asyncio.shield(shared)
+
+        shared = asyncio.ensure_future(self._execute(func, priority, idempotent))
+        self._inflight[key] = shared
+        shared.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(shared)
+
+    def _forget(self, key: Hashable, done: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        # Ошибку уже получили ожидающие; если их не осталось - не шумим в лог
+        if not done.cancelled():
+            done.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": len(self._waiting),
+            "in_flight": len(self._inflight),
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "throttled": self.throttled,
+        }
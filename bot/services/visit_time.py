@@ -0,0 +1,109 @@
+"""
+Codec for visit date/time values stored in the sheet
+
+The sheet keeps the human-readable string from the web app
+("Пт, 16 січня 2026, 15:00") plus a machine-readable ISO column. The
+display string is the source of truth: the admin panel edits only that
+one, so the ISO column can lag behind and is used only as a fallback.
+Everything that compares visit times (reminders, availability, listings)
+goes through this module, so each raw string is parsed once.
+"""
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Optional
+
+from bot.metrics import VISIT_PARSE_FAILURES
+
+logger = logging.getLogger(__name__)
+
+MONTHS_UA = {
+    'січня': 1, 'лютого': 2, 'березня': 3, 'квітня': 4, 'травня': 5, 'червня': 6,
+    'липня': 7, 'серпня': 8, 'вересня': 9, 'жовтня': 10, 'листопада': 11, 'грудня': 12
+}
+MONTH_NAMES_UA = {number: name for name, number in MONTHS_UA.items()}
+WEEKDAYS_UA = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Нд']  # datetime.weekday() order
+
+# "[Пт, ]16 січня 2026, 15:00" - день недели необязателен (старые записи)
+_VISIT_RE = re.compile(
+    r"^\s*(?:[^\W\d_]{2,3},\s*)?(\d{1,2})\s+([^\W\d_]+)\s+(\d{4}),\s*(\d{1,2}):(\d{2})\s*$"
+)
+
+# Counters for monitoring; failures are counted once per distinct string
+_stats = {"parsed": 0, "failures": 0}
+
+
+@lru_cache(maxsize=8192)
+def parse_visit_datetime(value: str) -> Optional[datetime]:
+    """
+    Parse "Пт, 16 січня 2026, 15:00" (or "16 січня 2026, 15:00").
+    Returns None if the string has an unknown format. Memoized.
+    """
+    if not value:
+        return None
+    match = _VISIT_RE.match(value)
+    month = MONTHS_UA.get(match.group(2).lower()) if match else None
+    if month is None:
+        _stats["failures"] += 1
+        VISIT_PARSE_FAILURES.inc()
+        logger.warning(f"⚠️ Unparsable visit date/time: {value!r}")
+        return None
+    
+    day, _, year, hour, minute = match.groups()
+    try:
+        result = datetime(int(year), month, int(day), int(hour), int(minute))
+    except ValueError:
+        _stats["failures"] += 1
+        VISIT_PARSE_FAILURES.inc()
+        logger.warning(f"⚠️ Invalid visit date/time: {value!r}")
+        return None
+    _stats["parsed"] += 1
+    return result
+
+
+@lru_cache(maxsize=8192)
+def parse_iso(value: str) -> Optional[datetime]:
+    """Parse the machine-readable column, None if empty or broken"""
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def to_iso(value: datetime) -> str:
+    """datetime -> "2026-01-16T15:00" for the ISO column"""
+    return value.isoformat(timespec="minutes")
+
+
+def format_visit(value: datetime) -> str:
+    """datetime -> "Пт, 16 січня 2026, 15:00" (same as the web app)"""
+    return (
+        f"{WEEKDAYS_UA[value.weekday()]}, {value.day} {MONTH_NAMES_UA[value.month]} "
+        f"{value.year}, {value:%H:%M}"
+    )
+
+
+def visit_datetime(visit: str, visit_iso: str = "") -> Optional[datetime]:
+    """Visit time from the display string, the ISO column if it does not parse"""
+    return parse_visit_datetime(visit) or parse_iso(visit_iso)
+
+
+def record_visit_datetime(record: Dict) -> Optional[datetime]:
+    """Visit time of a sheet record (see visit_datetime)"""
+    return visit_datetime(
+        str(record.get("Visit Date/Time") or ""),
+        str(record.get("Visit ISO") or "")
+    )
+
+
+def parse_stats() -> Dict[str, int]:
+    """Parse counters and LRU cache usage"""
+    cache = parse_visit_datetime.cache_info()
+    return {
+        "parsed": _stats["parsed"],
+        "failures": _stats["failures"],
+        "cache_hits": cache.hits,
+        "cache_misses": cache.misses,
+        "cache_size": cache.currsize,
+    }
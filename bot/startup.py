@@ -0,0 +1,93 @@
+"""
+Cold start: milestones, readiness and the background warm-up
+"""
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Dict, Optional
+
+from bot import metrics
+from bot.services.availability import AvailabilityService
+from bot.services.google_sheets import GoogleSheetsService
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTracker:
+    """
+    Seconds from process start to each milestone of a cold start:
+
+        imports         - bot modules loaded
+        api             - HTTP server listening
+        polling         - updates are being received (or webhook set)
+        sheets          - Google Sheets connected (OAuth + spreadsheet open)
+        mirror          - local copy of the sheet synced
+        availability    - slot bitmaps built
+        first_reply     - first update handled
+
+    The bot is ready once it receives updates and has a local copy of the
+    sheet to answer from (restored from disk or freshly synced). Milestones
+    are logged, exported as startup_seconds{milestone} and served on /health.
+    """
+
+    def __init__(self, started: float):
+        # time.perf_counter() as early as possible in the process
+        self.started = started
+        self.milestones: Dict[str, float] = {}
+        self.warm_up_error: Optional[str] = None
+
+    def mark(self, milestone: str) -> None:
+        """Record a milestone (only its first occurrence counts)"""
+        if milestone in self.milestones:
+            return
+        elapsed = time.perf_counter() - self.started
+        self.milestones[milestone] = elapsed
+        metrics.STARTUP_SECONDS.labels(milestone).set(elapsed)
+        logger.info(f"⏱ Startup: {milestone} after {elapsed:.3f}s")
+
+    def is_ready(self, sheets: GoogleSheetsService) -> bool:
+        return "polling" in self.milestones and sheets.store.last_row is not None
+
+    def report(self, sheets: GoogleSheetsService) -> Dict:
+        return {
+            "ready": self.is_ready(sheets),
+            "uptime": time.perf_counter() - self.started,
+            "milestones": {name: round(value, 3) for name, value in self.milestones.items()},
+            "warm_up_error": self.warm_up_error,
+        }
+
+
+async def warm_up(
+    sheets: GoogleSheetsService,
+    availability: AvailabilityService,
+    tracker: StartupTracker,
+    attempts: int = 5
+) -> None:
+    """
+    Do what the first user would otherwise wait for: connect to Google,
+    sync the local copy and build the slot bitmaps. Meanwhile reads are
+    answered from the copy on disk (if there is one). Retried with backoff;
+    if Google stays down the bot keeps answering from that copy.
+    """
+    backoff = 2.0
+    sheets.warming_up = True
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                await sheets.connect()
+                tracker.mark("sheets")
+                await sheets.sync(full=True)
+                tracker.mark("mirror")
+                await availability.busy_mask(date.today())
+                tracker.mark("availability")
+                tracker.warm_up_error = None
+                return
+            except Exception as e:
+                tracker.warm_up_error = repr(e)
+                logger.warning(f"⚠️ Warm-up failed (attempt {attempt}): {e!r}")
+                if attempt < attempts:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 60.0)
+    finally:
+        sheets.warming_up = False
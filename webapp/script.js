@@ -1,15 +1,58 @@
+// Apps Script endpoint: busy slots straight from the sheet, used when the bot API is not known
 const GOOGLE_SCRIPT_URL = 'https://script.google.com/macros/s/AKfycbymLc_CQxyO9M9nZwuOjm_EHZa4aeiK8tzcLdCYp6Eh2tNTVPn95_UQ5_fYvKjpODr5/exec';
 
-// Function to check busy slots (API)
-async function getBusySlots(date) {
+// Bot API address, passed by the bot as ?api=... (API_PUBLIC_URL, see Config.webapp_launch_url).
+// When the page is served by the bot itself (/webapp/), the API is on the same origin.
+const BOT_API_URL = new URLSearchParams(window.location.search).get('api')
+    ?? (window.location.pathname.startsWith('/webapp/') ? '' : null);
+
+// ===== Availability cache =====
+// date -> { busy: ['14:00', ...], etag: '"..."', fetchedAt: ms }
+const availabilityCache = new Map();
+const AVAILABILITY_FRESH_MS = 30 * 1000; // re-validate a cached day after 30s
+const PREFETCH_DAYS = 14;
+
+// Busy bitmask (bit i = slot i from `open`) -> ['09:00', '10:30', ...]
+function maskToTimes(mask, open, slotMinutes, slots) {
+    const [h, m] = open.split(':').map(Number);
+    const times = [];
+    for (let i = 0; i < slots; i++) {
+        if ((mask >> i) & 1) {
+            const minutes = h * 60 + m + i * slotMinutes;
+            times.push(`${String(Math.floor(minutes / 60)).padStart(2, '0')}:${String(minutes % 60).padStart(2, '0')}`);
+        }
+    }
+    return times;
+}
+
+// Load the next PREFETCH_DAYS days in one request
+async function prefetchAvailability() {
+    if (BOT_API_URL === null) return;
     try {
-        console.log(`📡 Requesting slots for ${date}...`);
-        const response = await fetch(`${GOOGLE_SCRIPT_URL}?date=${date}`);
+        const response = await fetch(`${BOT_API_URL}/api/availability/range?days=${PREFETCH_DAYS}`, { cache: 'no-store' });
         const data = await response.json();
+        if (!data.success) return;
+        const fetchedAt = Date.now();
+        data.days.forEach(day => {
+            availabilityCache.set(day.date, {
+                busy: maskToTimes(day.busy_mask, data.open, data.slot_minutes, data.slots),
+                etag: day.etag,
+                fetchedAt
+            });
+        });
+        console.log(`📦 Prefetched availability for ${data.days.length} days`);
+    } catch (e) {
+        console.error('❌ Error prefetching slots:', e);
+    }
+}
 
+// Fallback without the bot API: the Apps Script reads the sheet (no caching)
+async function getBusySlotsFromSheet(date) {
+    try {
+        console.log(`📡 Requesting slots for ${date} from the sheet...`);
+        const response = await fetch(`${GOOGLE_SCRIPT_URL}?date=${date}`);
+        const data = await response.json();
         if (data.success) {
-            console.log('🔒 Busy slots from table:', data.busy_slots);
-            // Return array of times, e.g. ['14:00', '15:00']
             return data.busy_slots.map(slot => slot.time);
         }
         return [];
@@ -19,6 +62,43 @@ async function getBusySlots(date) {
     }
 }
 
+// Function to check busy slots (API)
+async function getBusySlots(date) {
+    if (BOT_API_URL === null) {
+        return getBusySlotsFromSheet(date);
+    }
+    const cached = availabilityCache.get(date);
+    if (cached && Date.now() - cached.fetchedAt < AVAILABILITY_FRESH_MS) {
+        return cached.busy;
+    }
+    try {
+        console.log(`📡 Requesting slots for ${date}...`);
+        const response = await fetch(`${BOT_API_URL}/api/availability?date=${date}`, {
+            cache: 'no-store',
+            headers: cached ? { 'If-None-Match': cached.etag } : {}
+        });
+
+        // Day did not change since we cached it
+        if (response.status === 304 && cached) {
+            cached.fetchedAt = Date.now();
+            return cached.busy;
+        }
+
+        const data = await response.json();
+        if (data.success) {
+            const busy = data.busy_slots.map(slot => slot.time);
+            console.log('🔒 Busy slots:', busy);
+            availabilityCache.set(date, { busy, etag: data.etag, fetchedAt: Date.now() });
+            // Return array of times, e.g. ['14:00', '14:30']
+            return busy;
+        }
+        return [];
+    } catch (e) {
+        console.error('❌ Error getting slots:', e);
+        return cached ? cached.busy : [];
+    }
+}
+
 const tg = window.Telegram?.WebApp;
 
 // Check if running in Telegram
@@ -189,6 +269,8 @@ function renderTimeSlots(busySlotsFromApi = []) {
     }
 
     const slots = generateTimeSlots();
+    const slotSet = new Set(slots);
+    const busySet = new Set(busySlotsFromApi);
     const now = new Date();
     const parts = dateValue.split('-');
     const selectedDate = new Date(parseInt(parts[0], 10), parseInt(parts[1], 10) - 1, parseInt(parts[2], 10));
@@ -216,7 +298,7 @@ function renderTimeSlots(busySlotsFromApi = []) {
         }
 
         // Check 2: Is slot itself busy?
-        if (!isDisabled && busySlotsFromApi.includes(slot)) {
+        if (!isDisabled && busySet.has(slot)) {
             isDisabled = true;
             tooltip = "Вже зайнято";
         }
@@ -230,7 +312,7 @@ function renderTimeSlots(busySlotsFromApi = []) {
                 const timeToCheck = addMinutes(slot, i * 30);
 
                 // If future block is busy
-                if (busySlotsFromApi.includes(timeToCheck)) {
+                if (busySet.has(timeToCheck)) {
                     isDisabled = true;
                     tooltip = "Недостатньо часу для послуги";
                     break;
@@ -238,7 +320,7 @@ function renderTimeSlots(busySlotsFromApi = []) {
 
                 // If future block is out of working hours (e.g. 20:30)
                 // We check if 'timeToCheck' exists in our generated slots (except the start time)
-                if (i > 0 && !slots.includes(timeToCheck)) {
+                if (i > 0 && !slotSet.has(timeToCheck)) {
                     isDisabled = true;
                     tooltip = "Скоро зачиняємось";
                     break;
@@ -545,6 +627,7 @@ elements.form.addEventListener('submit', submitForm);
 
 function init() {
     setupDateInput();
+    prefetchAvailability();
     updateProgress();
     updateButtons();
     renderTimeSlots();